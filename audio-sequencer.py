@@ -1,25 +1,29 @@
 # Requires install of PortAudio
 
 # Package imports
+# Only what is needed to show the window is imported here. matplotlib, scipy and sounddevice take seconds to import,
+# so they are imported on a background thread once the window is up (see PlayPause.Warmup) and soundfile when a
+# file is first saved
+
+import time  # used to measure the startup time
+StartTime = time.perf_counter()  # startup is timed from here
 
 import numpy  # numpy arrays are used to store and manipulate audio
-import sounddevice  # Used to output audio
-import soundfile  # used to save audio as wav file
-import scipy.signal  # used to create numpy arrays for different wavetypes and for audio filtering
-from scipy.io import wavfile  # used to create numpy array from wav file
 from tkinter import *  # tkinter is the GUI manager
+from tkinter import ttk  # used for the progress bar
+from tkinter import filedialog  # used to choose the sample of a drum track
 import itertools  # used to create toggle cycles
+import importlib  # used to import the slow packages in the background
 import os  # used to check file exists
-
-# Relevant to external code
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg  # used to plot onto tkinter window
-from matplotlib.figure import Figure  # used to plot
-
-# Below lines of code are used to ignore a warning caused when reusing matplotlib figures
-import warnings 
-import matplotlib.cbook
-matplotlib.use('TkAgg')
-warnings.filterwarnings("ignore", category=matplotlib.cbook.mplDeprecation)
+import sys  # used to read the project file given on the command line
+# Headless engine that renders the audio
+from sequencer_engine import Pattern, RenderEngine, Waveforms, SynthVoices, RenderThreadPrefix
+from playback import StreamingPlayer  # streams the loop to the audio device
+from profiling import SamplingProfiler  # samples the call stack while rendering
+from song import Song, ExportSong  # chains patterns into a song and writes it to disk a block at a time
+from worker import BackgroundWorker  # renders and saves without freezing the GUI
+from project import SaveProject, LoadProject  # saves and loads the pattern
+from rendercache import DiskCache  # keeps rendered tracks on disk between sessions
 
 # Global is used for certain variables because you cannot return to a widget callback/command
 
@@ -32,6 +36,7 @@ class TogglingButtons:
         self.TogglingButton.grid(row=row, column=column)
 
         # Use itertools to create a cycle for the button toggle effect
+        self.Colours = (colour1, colour2)
         self.ReliefCycle = itertools.cycle(['sunken', 'raised'])
         self.ColourCycle = itertools.cycle([colour2, colour1])
 
@@ -40,6 +45,16 @@ class TogglingButtons:
         self.TogglingButton['relief'] = str(next(self.ReliefCycle))
         self.TogglingButton['bg'] = str(next(self.ColourCycle))
 
+    # Function shows the button as on (sunken) or off (raised), used when a project is loaded
+    def Show(self, on):
+        # Restarts the cycles from off, then toggles once if the button should be on
+        self.ReliefCycle = itertools.cycle(['sunken', 'raised'])
+        self.ColourCycle = itertools.cycle([self.Colours[1], self.Colours[0]])
+        self.TogglingButton['relief'] = 'raised'
+        self.TogglingButton['bg'] = self.Colours[0]
+        if on:
+            self.Toggler()
+
 
 # This is a subclass for buttons used to sequence drums
 class DrumButtons(TogglingButtons):
@@ -48,16 +63,19 @@ class DrumButtons(TogglingButtons):
         super().__init__(window, row, column, colour1, colour2)
         # Reconfigures the button, lambda: [f() for f in] is used to have multiple commands for same button callback
         self.TogglingButton.config(height=2, width=6, bg=colour1,
-                                   command=lambda: [f() for f in [self.AlterSequence, self.Toggler]])
+                                   command=lambda: [f() for f in [self.AlterSequence, self.Toggler, LiveUpdate]])
 
         # Instance attributes for row and column needed for AlterSequence
         self.ButtonRow = row
         self.ButtonColumn = column
 
     def AlterSequence(self):
-        global Sequencer  # Allows changes to be made to the variable globally
-        # Multiplies the corresponding value in Sequencer by -1
-        Sequencer[self.ButtonRow-2][self.ButtonColumn-1] *= -1
+        # Switches the corresponding step of CurrentPattern on or off
+        CurrentPattern.ToggleStep(self.ButtonRow-2, self.ButtonColumn-1)
+
+    # Function shows the state of the step in CurrentPattern, each widget class has a Refresh function
+    def Refresh(self):
+        self.Show(CurrentPattern.Triggers[self.ButtonRow-2, self.ButtonColumn-1])
 
 
 # This is a subclass for buttons used to select options
@@ -66,15 +84,17 @@ class OptionButtons(TogglingButtons):
         # Calls the parent class, creating the button and allowing use of Toggler function
         super().__init__(window, row, column, colour1, colour2)
         # Reconfigures the button, lambda: [f() for f in] is used to have multiple commands for same button callback
-        self.TogglingButton.config(bg=colour1, text=text, command=lambda: [f() for f in [self.AlterOption, self.Toggler]])
+        self.TogglingButton.config(bg=colour1, text=text, command=lambda: [f() for f in [self.AlterOption, self.Toggler, LiveUpdate]])
 
         # Instance attributes for option needed for AlterOption
         self.Option = option
 
     def AlterOption(self):
-        global ButtonOptions # Allows changes to be made to the variable globally
         # Multiplies the corresponding value in ButtonOptions by -1
-        ButtonOptions[self.Option] *= -1
+        CurrentPattern.ButtonOptions[self.Option] *= -1
+
+    def Refresh(self):
+        self.Show(CurrentPattern.ButtonOptions[self.Option] == 1)
 
 
 # This is a subclass for buttons used to mute channels
@@ -83,15 +103,26 @@ class MuteButtons(TogglingButtons):
         # Calls the parent class, creating the button and allowing use of Toggler function
         super().__init__(window, row, column, colour1, colour2)
         # Reconfigures the button, lambda: [f() for f in] is used to have multiple commands for same button callback
-        self.TogglingButton.config(text='MUTE', bg=colour1, command=lambda: [f() for f in [self.AlterMute, self.Toggler]])
+        self.TogglingButton.config(text='MUTE', bg=colour1, command=lambda: [f() for f in [self.AlterMute, self.Toggler, LiveUpdate]])
 
         # Instance attributes for row needed for AlterMute
         self.Row = row
 
     def AlterMute(self):
-        # Multiplies the corresponding value in Sequencer by -1
-            global MuteOptions
-            MuteOptions[self.Row-2] *= -1
+        # Mutes or unmutes the track on this row
+        CurrentPattern.Mutes[self.Row-2] = not CurrentPattern.Mutes[self.Row-2]
+
+    def Refresh(self):
+        self.Show(CurrentPattern.Mutes[self.Row-2])
+
+
+# This is a subclass for buttons that switch a feature on and off by calling a function
+class CommandButtons(TogglingButtons):
+    def __init__(self, window, row, column, colour1, colour2, text, command):
+        # Calls the parent class, creating the button and allowing use of Toggler function
+        super().__init__(window, row, column, colour1, colour2)
+        # Reconfigures the button, lambda: [f() for f in] is used to have multiple commands for same button callback
+        self.TogglingButton.config(bg=colour1, text=text, command=lambda: [f() for f in [command, self.Toggler]])
 
 
 # This class is drop down lists used to write the musical notes
@@ -112,9 +143,58 @@ class NoteMenus:
         self.MenuColumn = column
 
     def AlterNote(self, value):
-        global Sequencer  # Allows changes to be made to the variable globally
-        # Assigns corresponding Sequencer value (at correct index) to the Note chosen by user
-        Sequencer[self.MenuRow-2][self.MenuColumn-1] = value
+        # Assigns corresponding step of CurrentPattern (at correct index) to the Note chosen by user
+        CurrentPattern.SetNote(self.MenuRow-2, self.MenuColumn-1, value)
+        LiveUpdate()
+
+    def Refresh(self):
+        self.Note.set(CurrentPattern.NoteName(self.MenuRow-2, self.MenuColumn-1))
+
+
+# This class is drop down lists used to choose the waveform of a synthesiser
+class WaveformMenus:
+    # Function initialises instances of the class
+    def __init__(self, window, row, column, channel):
+        self.Waveform = StringVar(window)  # Creates instance attribute Waveform
+        self.Waveform.set(CurrentPattern.Waveforms[channel])  # Sets Waveform to the current waveform of the channel
+        # Creates drop down list with the waveforms supported by the engine
+        self.WaveformMenu = OptionMenu(window, self.Waveform, *Waveforms, command=self.AlterWaveform)
+        self.WaveformMenu.grid(row=row, column=column)  # places drop down list on grid
+
+        # Instance attribute for channel needed for AlterWaveform
+        self.Channel = channel
+
+    def AlterWaveform(self, value):
+        CurrentPattern.Waveforms[self.Channel] = value
+        LiveUpdate()
+
+    def Refresh(self):
+        self.Waveform.set(CurrentPattern.Waveforms[self.Channel])
+
+
+# This class is buttons used to choose a wav sample for a drum track to play instead of its own sound
+class SampleButtons:
+    # Function initialises instances of the class
+    def __init__(self, window, row, column, track):
+        self.Track = track
+        self.SampleButton = Button(window, bg='grey', width=10, command=self.ChooseSample)
+        self.SampleButton.grid(row=row, column=column)
+        self.ShowSample()
+
+    def ChooseSample(self):
+        Path = filedialog.askopenfilename(filetypes=[('Wav files', '*.wav')])
+        if Path:  # empty when the dialog is cancelled
+            CurrentPattern.SetSample(self.Track, Path)
+            self.ShowSample()
+            LiveUpdate()
+
+    def Refresh(self):
+        self.ShowSample()
+
+    # Function shows the file name of the sample, or Sample when the track plays its own sound
+    def ShowSample(self):
+        Path = CurrentPattern.Samples[self.Track]
+        self.SampleButton['text'] = os.path.basename(Path) if Path is not None else 'Sample'
 
 
 # This class only used once but I decided to have most GUI widgets as classes to help with readability and consistency
@@ -126,7 +206,7 @@ class BPMEntryField:
         # Contains external code from https://riptutorial.com/tkinter/example/27780/adding-validation-to-an-entry-widget
         self.EntryField = Entry(window, width=5, validate="key",
                                 validatecommand=((window.register(self.ForceNumbers)), '%S'))
-        self.EntryField.insert(0, 120)  # inserts default value into entry field
+        self.EntryField.insert(0, CurrentPattern.BPM)  # inserts default value into entry field
         self.EntryField.grid(row=row, column=column)  # places entry field on the grid
 
         # Create button widget which when pressed calls NumberEntry command
@@ -148,31 +228,59 @@ class BPMEntryField:
             ErrorMessage.pack()
         else:
             # Else the value is within range
-            global BPM
-            # int and get() used to get integer value of entry, this is then assigned to BPM globally
-            BPM = int(self.EntryField.get())
+            # int and get() used to get integer value of entry, this is then assigned to the BPM of CurrentPattern
+            CurrentPattern.BPM = int(self.EntryField.get())
             self.EntryField.config(bg='white')  # returns background to white
+            LiveUpdate()
+
+    def Refresh(self):
+        self.EntryField.delete(0, END)
+        self.EntryField.insert(0, CurrentPattern.BPM)
+        self.EntryField.config(bg='white')
 
 # Class for all Scale widgets
 class Sliders:
     # Function initialises instances of the class
-    def __init__(self, window, row, column, start=1, stop=5, default=3, orientation=HORIZONTAL):
+    # track is the track whose slider value is changed, None for the master gain slider
+    def __init__(self, window, row, column, start=1, stop=5, default=3, orientation=HORIZONTAL, track=None):
+        self.Track = track  # Instance attribute for track needed for SliderAssign function
+
         # Creates Scale widget with parameters defined by class arguments
         self.Slider = Scale(window, from_=start, to=stop, orient=orientation, command=self.SliderAssign)
         self.Slider.set(default)  # Sets the default value
         self.Slider.grid(row=row, column=column)  # Places Slider on grid
 
-        self.Row = row  # Instance attribute for row needed for SliderAssign function
+    def SliderAssign(self, value):
+        # Changes value of SliderValues at correct index, or the master gain
+        if self.Track is None:
+            CurrentPattern.MasterGain = int(value)
+        else:
+            CurrentPattern.SliderValues[self.Track] = int(value)
+        LiveUpdate()
+
+    def Refresh(self):
+        self.Slider.set(CurrentPattern.MasterGain if self.Track is None else CurrentPattern.SliderValues[self.Track])
+
+
+# Slider for the swing of the pattern, the percentage of a step that every second step is played late by
+class SwingSlider(Sliders):
+    def __init__(self, window, row, column):
+        super().__init__(window, row, column, 0, 50, 0)
 
     def SliderAssign(self, value):
-        global SliderValues
-        # Changes vlaue of SilderValues at correct index globally
-        SliderValues[self.Row-2] = int(value)
+        CurrentPattern.Swing = int(value) / 100
+        LiveUpdate()
+
+    def Refresh(self):
+        self.Slider.set(round(CurrentPattern.Swing * 100))
 
 
 class PlayPause:
+    Playing = False  # True between PLAY and PAUSE, changes made while playing are rendered straight away
+
     # Function initialises instances of the class
-    def __init__(self, window, bpm, playrow=0, playcolumn=19, pauserow=0, pausecolumn=20, saverow=0, savecolumn=0):
+    def __init__(self, window, bpm, playrow=0, playcolumn=19, pauserow=0, pausecolumn=20, saverow=0, savecolumn=0,
+                 plotcolumns=16, progressrow=9, progresscolumn=1):
         # Creates buttons and text entry field
         self.PlayButton = Button(window, bg='green', text='PLAY', command=self.Play)
         self.PauseButton = Button(window, bg='red', text='PAUSE', command=self.Pause)
@@ -185,210 +293,330 @@ class PlayPause:
         self.PauseButton.grid(row=pauserow, column=pausecolumn)
         self.SaveButton.grid(row=saverow+1, column=savecolumn)
         self.SaveEntry.grid(row=saverow, column=savecolumn)
+        # Shows how much of the current render, save or export has finished
+        PlayPause.ProgressBar = ttk.Progressbar(window, mode='determinate', maximum=1.0)
+        PlayPause.ProgressBar.grid(row=progressrow, column=progresscolumn, columnspan=plotcolumns, sticky='ew')
 
         # instance attribute for window needed for PlotAudio function
         self.Window = window
 
-        # Class attributes used in both plotting and generation of audio defined
-        PlayPause.SampleRate = 44100
-        PlayPause.Duration = (60 / bpm) / 4  # calculates the duration of the 1/4 beat in seconds
-        PlayPause.BeatLength = int(PlayPause.Duration * PlayPause.SampleRate)  # as above in samples
-
-        # Creates numpy array for time axis used in plotting
-        PlayPause.TimeAxis = numpy.arange(PlayPause.BeatLength * 16)
-        # Creates numpy zero array with length of full loop
-        PlayPause.SilentChannel = numpy.zeros(PlayPause.BeatLength * 16)
+        # The headless render engine does all of the audio generation, this class only drives it from the GUI
+        # Tracks are rendered on a thread each, up to the number of cores, and kept on disk in RenderCacheLocation
+        PlayPause.Engine = RenderEngine(EngineSampleRate, workers=min(len(CurrentPattern.Tracks), os.cpu_count() or 1),
+                                        diskcache=DiskCache(RenderCacheLocation))
 
-        # Creates a figure to be used in plotting, this is in the __init__ function so a blank plot appears at start
+        # Class attributes used in both plotting and generation of audio defined
+        PlayPause.SampleRate = PlayPause.Engine.SampleRate
+        PlayPause.BeatLength = PlayPause.Engine.BeatLength(bpm)  # length of 1/4 beat in samples
+        # Streams the audio, new loops are swapped in at the end of the current bar
+        PlayPause.Player = StreamingPlayer(PlayPause.SampleRate)
+        # Runs the engine and the file writing on a separate thread, only the worker thread uses the engine
+        PlayPause.Worker = BackgroundWorker()
+        self.PollWorker()
+
+        # The plot is created once matplotlib has been imported by Warmup, until then a blank frame of the same size
+        # holds its place on the grid
+        self.PlotColumns = plotcolumns
+        PlayPause.Canvas = None
+        PlayPause.Placeholder = Frame(window, width=1100, height=200)
+        PlayPause.Placeholder.grid(row=0, column=1, rowspan=2, columnspan=plotcolumns)
+        PlayPause.Worker.Submit(self.Warmup, done=self.WarmedUp)
+
+    # Function run by the worker thread when the program starts, imports the slow packages and builds the engine's
+    # filters so the first PLAY does not wait for them
+    def Warmup(self, progress, cancelled):
+        PlayPause.Engine.Warmup()
+        PlayPause.Player.Warmup()
+        importlib.import_module('matplotlib.figure')  # used to plot
+        importlib.import_module('matplotlib.backends.backend_tkagg')  # used to plot onto tkinter window
+
+    # Function called on the GUI thread once Warmup has finished
+    def WarmedUp(self, result):
+        if PlayPause.Canvas is None:
+            self.CreatePlot()
+        print('Plot and audio engine ready {:.0f} ms after start'.format((time.perf_counter() - StartTime) * 1000))
+
+    # Function creates the figure and canvas the audio is plotted on, a blank plot is shown until the first render
+    def CreatePlot(self):
+        # Relevant to external code
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg  # used to plot onto tkinter window
+        from matplotlib.figure import Figure  # used to plot
+
+        # Below lines of code are used to ignore a warning caused when reusing matplotlib figures
+        import warnings
+        import matplotlib.cbook
+        matplotlib.use('TkAgg')
+        warnings.filterwarnings("ignore", category=matplotlib.cbook.mplDeprecation)
+
+        # Creates a figure to be used in plotting
         PlayPause.PlotFigure = Figure(figsize=(11, 2))
         # Adds subplot
         PlayPause.AudioPlot = PlayPause.PlotFigure.add_subplot(111)
-        self.PlotAudio(PlayPause.SilentChannel) # plots a blank audio file on the figure
-
-    # Envelopes are used in this program to fade in, fade out and to shorten the length of the sounds
-    def EnvelopeGenerator(self, attack, release, silence, beatlength):
-        # numpy array  with values 0 to 1 with length of attack (fade in)
-        AttackArray = numpy.linspace(0, 1, num=int(attack))
-        # numpy array with values 0 to 1 with length of release (flipped horizontally for fade out)
-        ReleaseArray = numpy.flip(numpy.linspace(0, 1, num=int(release)))
-        # numpy.full array with length beatlength-attack-release-silence, fill value 1 (max amplitude for sustain)
-        SustainArray = numpy.full((int(beatlength) - int(attack) - int(release) - int(silence)), 1)
-        # numpy.zero array with length of silence (zero amplitude for silence)
-        SilenceArray = numpy.zeros(int(silence))
-
-        # stacks the above arrays into a single array
-        EnvelopeArray = numpy.hstack((AttackArray, SustainArray, ReleaseArray, SilenceArray))
-        return EnvelopeArray
-
-    # Function makes loop from the desired sequence
-    def LoopGenerator(self, sequence, sounddata, silentbeat):
-        LoopSequence = []  # creates empty list
-        for Beat in sequence:  # iterates through the sequence (list)
-            if Beat == 1:  # a 1 indicates the user has chosen a drum sound to be in this beat
-                LoopSequence.append(sounddata)  # appends the sound as numpy array to the LoopSequence list
-            elif type(Beat) == str and Beat != 'X': # a string other than 'X' indicates a musical note
-                LoopSequence.append(sounddata[Beat])  #appends the corresponding numpy array
-            else:  # the list value is -1 and the user has not chosen for the sound to be in this beat
-                LoopSequence.append(silentbeat)  # appends the zero numpy array to the LoopSequence list
-        # LoopSequence is now a list of numpy arrays
-        Loop = numpy.concatenate(LoopSequence)  # concatenates the list into a single numpy array
-        return Loop
-
-    # Function to synthesise melodic elements, the code is designed to reduce the processing required
-    # because only the notes needed are generated and if notes are repeated the same numpy array is reused
-    def SynthDataGenerator(self, sequence, envelope, notefrequencies, beatlength, attackfilter):
-        SynthData = {}  # will be dictionary with format {Note:numpy array of Note audio}
-        SynthNotes = list(set(sequence))  # list(set()) was used to remove duplicate notes
-        SynthNotes.remove('X')
-        for Note in SynthNotes:
-            # uses scipy.signal.square to produce a squarewave with frequency of musical note
-            SynthData[Note] = scipy.signal.square(2 * numpy.pi * notefrequencies[Note]
-                                                  * numpy.arange(beatlength) / PlayPause.SampleRate)
-            if attackfilter == 1:  # user has selected the attack filter option
-                SynthData[Note] = self.AttackFilter(SynthData[Note])  # calls AttackFilter function
-            SynthData[Note] *= envelope  # calculates product of audio with envelope
-        return (SynthData)
-
-    # Function applies an enveloped filter to provided audio (the cutoff frequency increases with time)
-    # This was a stretch goal and sounds a little rough due to artifacts created in the process but was interesting
-    # to code. scipy.signal.butter was used to create filter arrays and these were then applied to the audio
-    def AttackFilter(self, audio):
-        # The number of samples each filter (with unique cutoff freq) will be applied to
-        StepSize = 91
-        Steps = int(len(audio) / StepSize)  # the number of whole steps that fit in the length of the audio file
-        PreFilter = scipy.signal.butter(10, 250, fs=44100, output='sos')  # cutoff of 250 before main filter
-        Audio = scipy.signal.sosfilt(PreFilter, audio)  # applies the PreFilter to audio
-        # Creates an array with equal step size from 200 to 2500
-        EnvelopeArray = numpy.linspace(200, 2500, num=Steps + 1)
-        # This will be a list of numpy arrays containing audio, each with a filter of different cutoff frequency applied
-        FilteredList = []
-        for k in range(0, Steps + 1):  # iterates through the number of steps+1 to account for the remainder of division
-            Filter = (scipy.signal.butter(10, EnvelopeArray[k], fs=44100, output='sos'))
-            if k != Steps:
-                # Applies Filter to the corresponding slice of Audio
-                FilteredList.append(scipy.signal.sosfilt(Filter, Audio[StepSize * k:StepSize * (k + 1)]))
-            else:
-                # Applies Filter to the remaining samples of Audio (remainder of division)
-                FilteredList.append((scipy.signal.sosfilt(Filter, Audio[StepSize * k:])))
-        Audio = numpy.hstack(FilteredList)  # horizontally stacks the list of numpy arrays into a single array
-
-        # PostFilter is used to low pass the audio a final time to remove some of the roughness I believe is caused
-        # by digital artifacts from the above process
-        PostFilter = scipy.signal.butter(10, 10000, fs=44100, output='sos')
-        Audio = scipy.signal.sosfilt(PostFilter, Audio)
-        return Audio
-
-    def MakeMusic(self, beatlength, silentchannel):
-        SilentBeat = numpy.zeros(beatlength)  # Creates numpy zero array with length of 1/4 beat in samples
-        SoundDictionary = dict.fromkeys(['Kick', 'Snare', 'OpenHat', 'ClosedHat', 'LowSynth', 'TopSynth'])
-
-        #  Generation or import of drum sound data
-
-        # Kick drum
-        # Uses scipy.signal.chirp to create a sine wave with logarithmic decreasing frequency
-        # range determined by KickOption
-        # KickData is the product of this chirp with the KickEnvelope (Envelope used to fade in/out and reduce popping)
-        KickTimeArray = numpy.linspace(0, 0.125, num=beatlength)  # Creates numpy array with linspace
-        KickOption = SliderValues[0]  # determined by user with slider (changes deepness of kick)
-        KickEnvelope = self.EnvelopeGenerator(100, 900, 0, beatlength)  # calls EnvelopeGenerator
-        SoundDictionary['Kick'] = KickEnvelope * scipy.signal.chirp(KickTimeArray, f0=200 + KickOption * 10,
-                                                                    f1=55, t1=(0.04 + KickOption * 0.02),
-                                                                    method='logarithmic')
-
-        # Snare drum, attempted generation but was unsuccessful so uses imported WAV file
-        # Assigns audio file to SnareFile
-        SampleRateWav, SnareFile = wavfile.read(SnareLocation)
-        SnareOption = 6 - SliderValues[1]  # determined by user with slider (changes length of snare)
-        # Calls EnvelopeGenerator with the SnareOption determining the length of silence in the envelope
-        SnareEnvelope = self.EnvelopeGenerator(0, 200, SnareOption * beatlength / 8, beatlength)
-        # SnareData is product of SnareFile with length BeatLength and SnareEnvelope
-        # SnareFile is sliced because it is longer than any possible BeatLength
-        SoundDictionary['Snare'] = SnareEnvelope * 0.00003 * SnareFile[0:beatlength]
-
-        # HiHats, use numpy.random.normal to produce white noise
-        # Open/ClosedHatData are the product of this with the gain and respective envelopes
-        OpenHatOption = SliderValues[2]  # determined by user with slider (changes release/fade out of hat)
-        # Calls EnvelopeGenerator with the OpenHatOption determining the length of release
-        OpenHatEnvelope = self.EnvelopeGenerator(30, beatlength * OpenHatOption / 6, 0, beatlength)
-        SoundDictionary['OpenHat'] = OpenHatEnvelope * 0.07 * (numpy.random.normal(loc=0.0, scale=1.0, size=beatlength))
-
-        ClosedHatOption = 5 - SliderValues[3]  # determined by user with slider (changes length of hat)
-        # Calls EnvelopeGenerator with the ClosedHatOption determining the length of silence in the envelope
-        ClosedHatEnvelope = self.EnvelopeGenerator(30, beatlength / 8, beatlength * ClosedHatOption / 6, beatlength)
-        SoundDictionary['ClosedHat'] = ClosedHatEnvelope * 0.07 * (numpy.random.normal
-                                                                   (loc=0.0, scale=1.0, size=beatlength))
-
-        # Synthesisers
-
-        LowSynthOption = SliderValues[4] - 1  # determined by user with slider (changes attack/fade in of synth)
-        # Calls EnvelopeGenerator function with attack time determined by LowSynthOption
-        LowSynthEnvelope = self.EnvelopeGenerator(LowSynthOption * beatlength / 6 + beatlength / 10, beatlength / 10, 0,
-                                             beatlength) * 0.2
-        SoundDictionary['LowSynth'] = self.SynthDataGenerator(Sequencer[4], LowSynthEnvelope, NoteFrequencies, beatlength,
-                                                         ButtonOptions['LowFilter'])
-
-        TopSynthEnvelope = self.EnvelopeGenerator(300, 300, 0, beatlength) * 0.2
-        SoundDictionary['TopSynth'] = self.SynthDataGenerator(Sequencer[5], TopSynthEnvelope,
-                                                              NoteFrequencies, beatlength, 2)
-
-        # LoopGenerator is called to create a full 16x 1/4 beat loop for each channel
-        # Use the index on Sequencer to get the corresponding nested list, and provide correct sound data as argument
-
-        LoopDictionary = {}
-        Counter = 0
-        for Sound in SoundDictionary:
-            global MuteOptions
-            if MuteOptions[Counter] == 1:
-                LoopDictionary[Sound] = silentchannel
-            else:
-                LoopDictionary[Sound] = self.LoopGenerator(Sequencer[Counter], SoundDictionary[Sound], SilentBeat)
-            Counter += 1
-
-        # Below code is used to apply the low pass filter to the top synth if necessary
-        TopSynthOption = SliderValues[5] - 1
-        if ButtonOptions['HighFilter'] == 1:
-            FilterFreqs = [500, 2000, 6000, 10000, 16000]
-            # scipy.signal.butter used for butterworth filter
-            TopSynthFilter = scipy.signal.butter(10, FilterFreqs[TopSynthOption], fs=44100, output='sos')
-            # Applies the filter to the TopSynth loop
-            LoopDictionary['TopSynth'] = scipy.signal.sosfilt(TopSynthFilter, LoopDictionary['TopSynth'])
-
-        # Applies master gain to full loop
-        MasterGain = SliderValues[6] / 100
-        FullLoop = sum(LoopDictionary.values()) * MasterGain
-
-        return FullLoop
-
-    # Function plots audio waveform on tkinter GUI
-    def PlotAudio(self, audio):
-        PlayPause.AudioPlot.cla()  # clears the figure ready for new plot
-        PlayPause.TimeAxis = numpy.arange(PlayPause.BeatLength * 16)  # creates new time axis in case BPM has changed
-        PlayPause.AudioPlot.plot(PlayPause.TimeAxis, audio, color='blue')  # plots the numpy array audio
         PlayPause.AudioPlot.axis('off')  # removes the axis
+        # A single line is created here and only its data is changed by PlotAudio
+        PlayPause.WaveLine, = PlayPause.AudioPlot.plot([], [], color='blue', linewidth=0.5)
         # Throws a UserWarning that I have been unable to supress, other users online seem to have same issue
         PlayPause.PlotFigure.tight_layout()  # reduces the border around the plot
 
         # Contains external code from https://pythonprogramming.net/how-to-embed-matplotlib-graph-tkinter-gui/
-        Canvas = FigureCanvasTkAgg(PlayPause.PlotFigure, master=self.Window) # prepares the figure for placement on the grid
-        Canvas.get_tk_widget().grid(row=0, column=1, rowspan=2, columnspan=16) # positions the figure on the grid
-        Canvas.draw()
+        # The canvas is only created and placed on the grid once, PlotAudio redraws it
+        PlayPause.Canvas = FigureCanvasTkAgg(PlayPause.PlotFigure, master=self.Window)
+        # positions the figure above the step columns, in place of the blank frame
+        PlayPause.Placeholder.destroy()
+        PlayPause.Canvas.get_tk_widget().grid(row=0, column=1, rowspan=2, columnspan=self.PlotColumns)
+        self.PlotAudio(numpy.zeros(PlayPause.BeatLength * 16)) # plots a blank audio file on the figure
+
+    # Function reduces audio to the minimum and maximum of each of width columns, the result alternates between
+    # the two so drawing it as a line fills in the waveform the same way plotting every sample would
+    def WaveformEnvelope(self, audio, width):
+        if len(audio) <= width * 2:  # short audio is plotted as it is
+            return numpy.arange(len(audio)), audio
+        # Index of the first sample of each column
+        Edges = numpy.linspace(0, len(audio), num=width, endpoint=False).astype(int)
+        Envelope = numpy.empty(width * 2, dtype=audio.dtype)
+        Envelope[0::2] = numpy.minimum.reduceat(audio, Edges)
+        Envelope[1::2] = numpy.maximum.reduceat(audio, Edges)
+        return numpy.repeat(numpy.arange(width), 2), Envelope
 
-    # Function generates audio and then starts playback
+    # Function plots audio waveform on tkinter GUI
+    # The audio is reduced to one min/max pair per pixel so the time taken does not depend on the BPM
+    def PlotAudio(self, audio):
+        if PlayPause.Canvas is None:  # rendered before Warmup finished
+            self.CreatePlot()
+        Width = int(PlayPause.PlotFigure.get_figwidth() * PlayPause.PlotFigure.dpi)  # width of the plot in pixels
+        XData, YData = self.WaveformEnvelope(audio, Width)
+        PlayPause.WaveLine.set_data(XData, YData)
+        Peak = max(float(numpy.max(numpy.abs(YData))), 0.01)  # y axis fits the loudest sample, a silent loop gets 0.01
+        PlayPause.AudioPlot.set_xlim(0, XData[-1])
+        PlayPause.AudioPlot.set_ylim(-Peak * 1.05, Peak * 1.05)
+        PlayPause.Canvas.draw_idle()
+
+    # Function hands finished work from the worker thread to the GUI, it runs every PollInterval ms
+    # The next poll is scheduled first so an error in a callback cannot stop results reaching the GUI
+    def PollWorker(self):
+        self.Window.after(PollInterval, self.PollWorker)
+        PlayPause.Worker.Poll()
+
+    def ShowProgress(self, fraction):
+        PlayPause.ProgressBar['value'] = fraction
+
+    # Function asks the worker to generate audio from the current state of the GUI
+    # A copy of CurrentPattern is rendered so the widgets can keep changing it, and a newer render makes any render
+    # still running stale so it stops early
+    def Render(self):
+        PlayPause.BeatLength = PlayPause.Engine.BeatLength(CurrentPattern.BPM)  # recalculated in case new BPM
+        PlayPause.ProgressBar['value'] = 0
+        PlayPause.Worker.Submit(self.RenderMusic, CurrentPattern.Copy(), kind='render', done=self.Rendered,
+                                progress=self.ShowProgress)
+
+    # Function run by the worker thread, returns the rendered loop and the first profile record of the render
+    def RenderMusic(self, pattern, progress, cancelled):
+        Profile = PlayPause.Engine.Profile  # records the time of each stage when profiling is switched on
+        FirstRecord = len(Profile.Records)
+        with Profile.Stage('Render'):
+            # The engine reuses its loop array, so the GUI is given a copy
+            Music = PlayPause.Engine.MakeMusic(pattern, progress, cancelled).copy()
+        return Music, FirstRecord
+
+    # Function called on the GUI thread with a finished render, plots it and queues it to be played from the next bar
+    def Rendered(self, result):
+        PlayPause.Music, FirstRecord = result
+        Profile = PlayPause.Engine.Profile
+        with Profile.Stage('PlotAudio'):
+            self.PlotAudio(PlayPause.Music) # calls PlotAudio function to update the figure
+        with Profile.Stage('Queue'):
+            PlayPause.Player.Queue(PlayPause.Music)
+        PlayPause.ProgressBar['value'] = 1
+        ProfilingControls.ShowRender(FirstRecord)
+
+    # Function generates audio and then starts playback, the loop repeats until PAUSE is pressed
     def Play(self):
-        PlayPause.Duration = (60 / BPM) / 4  # calculates the duration of the 1/4 beat in seconds
-        PlayPause.BeatLength = int(PlayPause.Duration * PlayPause.SampleRate)  # as above in samples
-        PlayPause.SilentChannel = numpy.zeros(PlayPause.BeatLength * 16)  # SilentChannel recalculated in case new BPM
-        PlayPause.Music = self.MakeMusic(PlayPause.BeatLength, PlayPause.SilentChannel) # calls MakeMusic function
-        self.PlotAudio(PlayPause.Music) # calls PlotAudio function to update the figure
-        sounddevice.play(PlayPause.Music, 44100, loop=True) # uses sound device to playback numpy array, looping
+        self.Render()
+        PlayPause.Player.Start()
+        PlayPause.Playing = True
 
     # Function stops audio playback
     def Pause(self):
-        sounddevice.stop()
+        PlayPause.Player.Stop()
+        PlayPause.Playing = False
+        if PlayPause.Player.Underruns:
+            print('Playback ran out of audio', PlayPause.Player.Underruns, 'times, try a larger block size')
+            PlayPause.Player.Underruns = 0
 
-    # Function saves current audio as wav file with name from entryfield
+    # Function saves current audio as wav file with name from entryfield, the file is written by the worker thread
     def Save(self):
-        soundfile.write(self.SaveEntry.get()+'.wav', PlayPause.Music, 44100)
+        PlayPause.Worker.Submit(self.WriteMusic, self.SaveEntry.get()+'.wav', PlayPause.Music, done=self.Saved)
+
+    # Function run by the worker thread, progress and cancelled are not used as the loop is written in one call
+    def WriteMusic(self, filename, music, progress, cancelled):
+        import soundfile  # used to save audio as wav file
+        soundfile.write(filename, music, PlayPause.SampleRate)
+        return filename
+
+    def Saved(self, filename):
+        print('Saved', filename)
+
+# This class holds the profiling buttons and the status readout of the last render
+class ProfileControls:
+    # Function initialises instances of the class
+    # threadid is the thread that renders the audio, it is sampled by the Sampler button along with the threads the
+    # engine renders channels on
+    # memory is False when the engine renders channels on several threads, as the bytes would be wrong
+    def __init__(self, window, profile, threadid, row=8, statuscolumn=1, profilecolumn=19, samplercolumn=20,
+                 statuscolumns=16, memory=True):
+        self.Profile = profile
+        self.Memory = memory
+        self.Sampler = SamplingProfiler(threadid=threadid, threadprefix=RenderThreadPrefix)
+
+        self.StatusLabel = Label(window, text='Profiling off', anchor='w')
+        self.StatusLabel.grid(row=row, column=statuscolumn, columnspan=statuscolumns, sticky='w')
+        self.ProfileButton = CommandButtons(window, row, profilecolumn, 'grey', 'red', 'Profile', self.ToggleProfile)
+        self.SamplerButton = CommandButtons(window, row, samplercolumn, 'grey', 'red', 'Sampler', self.ToggleSampler)
+
+    # Function switches stage timing on, or off and writes everything recorded to ProfileLocation
+    def ToggleProfile(self):
+        if self.Profile.Enabled:
+            self.Profile.Disable()
+            self.Profile.Dump(ProfileLocation, self.Sampler)
+            self.StatusLabel['text'] = 'Profiling off, profile written to ' + ProfileLocation
+        else:
+            self.Profile.Clear()
+            self.Profile.Enable(self.Memory)
+            self.StatusLabel['text'] = 'Profiling on, press PLAY or make a change while playing'
+
+    # Function starts or stops the sampling profiler, the most sampled functions are printed when it stops
+    def ToggleSampler(self):
+        self.Sampler.Toggle()
+        if not self.Sampler.Running():
+            for Function, Fraction in self.Sampler.Report(10):
+                print('{:6.1%}  {}'.format(Fraction, Function))
+
+    # Function shows the time taken by the stages of the render whose records start at firstrecord
+    def ShowRender(self, firstrecord):
+        if not self.Profile.Enabled:
+            return
+        Summary = self.Profile.Summary(firstrecord)
+        Readout = ['{} {:.1f} ms'.format(Stage, Summary[Stage]['seconds'] * 1000)
+                   for Stage in ['Render', 'MakeMusic', 'Mix', 'PlotAudio'] if Stage in Summary]
+        # The channels that were rendered, slowest first
+        Channels = sorted((Name for Name in Summary if Name.startswith('Channel:')),
+                          key=lambda Name: -Summary[Name]['seconds'])
+        Readout += ['{} {:.1f} ms'.format(Name.split(':')[1], Summary[Name]['seconds'] * 1000) for Name in Channels]
+        if self.Memory and 'Render' in Summary:  # not recorded when profiling was switched on during the render
+            Readout.append('peak {:.1f} MB'.format(Summary['Render']['bytes'] / 1e6))
+        self.StatusLabel['text'] = ' | '.join(Readout)
+
+
+# This class holds the song (arrangement) controls, the current pattern can be added to the song any number of
+# times and the whole song exported to a wav file
+class SongControls:
+    # Function initialises instances of the class
+    def __init__(self, window, row, statuscolumn=1, repeatscolumn=19, addcolumn=20, exportcolumn=21, clearcolumn=22,
+                 statuscolumns=16):
+        self.Song = Song()
+
+        self.StatusLabel = Label(window, anchor='w')
+        self.StatusLabel.grid(row=row, column=statuscolumn, columnspan=statuscolumns, sticky='w')
+        # Number of times the pattern is repeated when it is added
+        self.RepeatsEntry = Entry(window, width=5)
+        self.RepeatsEntry.insert(0, '4')
+        self.RepeatsEntry.grid(row=row, column=repeatscolumn)
+        self.AddButton = Button(window, bg='grey', text='Add to Song', command=self.AddPattern)
+        self.AddButton.grid(row=row, column=addcolumn)
+        self.ExportButton = Button(window, bg='orange', text='Export Song', command=self.Export)
+        self.ExportButton.grid(row=row, column=exportcolumn)
+        self.ClearButton = Button(window, bg='grey', text='Clear Song', command=self.ClearSong)
+        self.ClearButton.grid(row=row, column=clearcolumn)
+        self.ShowSong()
+
+    # Function adds a snapshot of CurrentPattern, so later edits do not change the parts already in the song
+    def AddPattern(self):
+        Repeats = self.RepeatsEntry.get()
+        if not Repeats.isdigit() or int(Repeats) < 1:
+            self.RepeatsEntry.config(bg='red')
+            return
+        self.RepeatsEntry.config(bg='white')
+        self.Song.Add(CurrentPattern.Copy(), int(Repeats))
+        self.ShowSong()
+
+    def ClearSong(self):
+        self.Song.Clear()
+        self.ShowSong()
+
+    # Function writes the song to a wav file named after the save entry with -song added
+    # The song is rendered and written by the worker thread, a copy is exported so the song can keep being edited
+    def Export(self):
+        if not self.Song.Entries:
+            return
+        FileName = PlayPauseButtons.SaveEntry.get() + '-song.wav'
+        self.StatusLabel['text'] = 'Exporting song to ' + FileName
+        PlayPause.ProgressBar['value'] = 0
+        PlayPause.Worker.Submit(self.ExportJob, self.Song.Copy(), FileName, done=self.Exported,
+                                progress=PlayPauseButtons.ShowProgress)
+
+    # Function run by the worker thread
+    def ExportJob(self, song, filename, progress, cancelled):
+        ExportSong(song, filename, PlayPause.Engine, progress=progress, cancelled=cancelled)
+        return filename
+
+    def Exported(self, filename):
+        self.StatusLabel['text'] = 'Song written to ' + filename
+
+    # Function shows the number of patterns in the song and its length
+    def ShowSong(self):
+        Seconds = self.Song.Length(PlayPause.Engine) / PlayPause.SampleRate
+        self.StatusLabel['text'] = 'Song: {} pattern(s), {}:{:04.1f}'.format(len(self.Song.Entries),
+                                                                            int(Seconds // 60), Seconds % 60)
+
+
+# This class holds the buttons that save the pattern to a project file and load it back
+class ProjectButtons:
+    # Function initialises instances of the class
+    def __init__(self, window, row, savecolumn=19, loadcolumn=20):
+        self.SaveButton = Button(window, bg='orange', text='Save Project', command=self.Save)
+        self.SaveButton.grid(row=row, column=savecolumn)
+        self.LoadButton = Button(window, bg='grey', text='Load Project', command=self.Load)
+        self.LoadButton.grid(row=row, column=loadcolumn)
+
+    def Save(self):
+        Path = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('Project files', '*.json')])
+        if Path:  # empty when the dialog is cancelled
+            SaveProject(CurrentPattern, Path)
+
+    # Function replaces CurrentPattern with the pattern in a project file and updates every widget to show it
+    # The grid is built when the program starts, so a project with other tracks or steps is opened by starting the
+    # program with the project file as its argument
+    def Load(self):
+        global CurrentPattern
+        Path = filedialog.askopenfilename(filetypes=[('Project files', '*.json')])
+        if not Path:
+            return
+        try:
+            LoadedPattern = LoadProject(Path)
+            if LoadedPattern.Tracks != CurrentPattern.Tracks or LoadedPattern.Steps != CurrentPattern.Steps:
+                raise ValueError('the project has different tracks or steps to the grid\n'
+                                 'Please restart with: python audio-sequencer.py ' + Path)
+        except (OSError, ValueError) as Error:
+            ErrorPopUp = Toplevel()
+            ErrorMessage = Message(ErrorPopUp, text='Unable to load project\n' + str(Error))
+            ErrorMessage.pack()
+            return
+        CurrentPattern = LoadedPattern
+        RefreshWidgets()
+        LiveUpdate()
+
+
+# Function makes every widget show the current state of CurrentPattern
+def RefreshWidgets():
+    for GridWidget in WidgetList:
+        if hasattr(GridWidget, 'Refresh'):  # labels have nothing to refresh
+            GridWidget.Refresh()
+
+
+# Called by the widgets after every change, while playing the change is rendered and heard on the next bar
+def LiveUpdate():
+    if PlayPause.Playing:
+        PlayPauseButtons.Render()
 
 # Class for GUI labels
 class Labels:
@@ -399,82 +627,106 @@ class Labels:
 print('Welcome to the Drum Machine/Synthesier/Sequencer\nInformation on using this program can be found in the'
       ' attached report\nHeadphones are recommended, I hope you enjoy!\n')
 
-# Dictionary with format {Note:Frequency(Hz)}
-NoteFrequencies = {'A': 55, 'A#': 58.27, 'B': 61.74, 'C': 65.41, 'C#': 69.3, 'D': 73.42, 'D#': 77.78,
-                   'E': 82.41, 'F': 87.31, 'F#': 92.5, 'G': 98, 'G#': 103.83}
-
-# Entry of location of snare drum file for import, with error checking
-SnareLocation = r'Snare.wav'
-# While loop repeats until file ends with .wav and exists
-while not SnareLocation.endswith('.wav') or not os.path.isfile(SnareLocation):
-    print("Invalid file type/location, only compatible with .wav files")
-    SnareLocation = input('Please enter a valid file location: ')
-
-# Default values are set
-BPM = 120  # used with global in the NumberEntry function of BPMEntryField class
-SliderValues = [3] * 6 + [100]  # used with global in the SliderAssign function of Slider class
-# Sequencer will be a nested list with each sublist corresponding to the pattern of an audio channel
-Sequencer = []  # used with global in the classes
-MuteOptions = [-1]*6  # used with global in the classes
-ButtonOptions = {'LowFilter': -1, 'HighFilter': -1}  # used with global in the classes
+# Holds the steps, notes and settings chosen with the widgets, the widgets change it directly
+# The grid of widgets below is built from its tracks and steps
+if len(sys.argv) > 1:  # python audio-sequencer.py project.json opens a saved project
+    CurrentPattern = LoadProject(sys.argv[1])
+else:
+    # Entry of location of snare drum file for import, with error checking
+    SnareLocation = r'Snare.wav'
+    # While loop repeats until file ends with .wav and exists
+    while not SnareLocation.endswith('.wav') or not os.path.isfile(SnareLocation):
+        print("Invalid file type/location, only compatible with .wav files")
+        SnareLocation = input('Please enter a valid file location: ')
+    CurrentPattern = Pattern(snarelocation=SnareLocation)
+
+# Text of the label at the start of each track and of the label next to its slider
+TrackLabels = {'Kick': 'Kick', 'Snare': 'Snare', 'OpenHat': 'Open HiHat', 'ClosedHat': 'Closed HiHat',
+               'LowSynth': 'Low Synth', 'TopSynth': 'Top Synth'}
+SliderLabels = {'Kick': 'Deepness', 'Snare': 'Length', 'OpenHat': 'Decay', 'ClosedHat': 'Length',
+                'LowSynth': 'Attack', 'TopSynth': 'Filter Cutoff'}
 
 # Creates main/root window for GUI elements
 MasterWindow = Tk()
 
+GridSteps = CurrentPattern.Steps  # number of step columns, the other controls are placed to the right of them
+GridTracks = len(CurrentPattern.Tracks)  # number of track rows, starting at row 2
+
 # The below nested for loops are used to iterate over the range of rows and columns needed
 
 WidgetList = []  # widget list will be a list full of class instances, used to iterate over range of rows and columns
-for i in range(2, 6):  # iterates 4 times (4 rows)
-    # Appends a list with -1 16 times to sequencer, -1 is default value and corresponds to a silent/dead beat
-    Sequencer.append([-1] * 16)
-    for j in range(1, 17):  # iterates 16 times (16 columns)
-        if j in [1, 5, 9, 13]:  # causes the drum buttons on the downbeats to be a different colour
-            Colour1 = 'PaleGreen3'
-            Colour2 = 'Green3'
+for Track, Voice in enumerate(CurrentPattern.Tracks):
+    Row = Track + 2  # offsets the row by 2
+    for Column in range(1, GridSteps + 1):
+        if Voice in SynthVoices:
+            # Creates an instance of NoteMenus on each iteration
+            WidgetList.append(NoteMenus(MasterWindow, Row, Column))
         else:
-            Colour1 = 'LightSkyBlue2'
-            Colour2 = 'DeepSkyBlue3'
-        # Creates an instance of DrumButtons on each iteration
-        WidgetList.append(DrumButtons(MasterWindow, i, j, Colour1, Colour2))
+            if (Column - 1) % 4 == 0:  # causes the drum buttons on the downbeats to be a different colour
+                Colour1 = 'PaleGreen3'
+                Colour2 = 'Green3'
+            else:
+                Colour1 = 'LightSkyBlue2'
+                Colour2 = 'DeepSkyBlue3'
+            # Creates an instance of DrumButtons on each iteration
+            WidgetList.append(DrumButtons(MasterWindow, Row, Column, Colour1, Colour2))
+
+    # Labels the track, numbering voices that are used by more than one track
+    Number = CurrentPattern.TrackNames()[Track][len(Voice):]
+    WidgetList.append(Labels(MasterWindow, Row, 0, TrackLabels[Voice] + (' ' + Number if Number else '')))
+    WidgetList.append(Labels(MasterWindow, Row, GridSteps + 1, SliderLabels[Voice]))
+    # Creates an instance of Sliders and MuteButtons for each track
+    WidgetList.append(Sliders(MasterWindow, Row, GridSteps + 2, track=Track))
+    WidgetList.append(MuteButtons(MasterWindow, Row, GridSteps + 4, 'grey', 'red'))
+
+    # The synth options belong to the voice, so they are only shown on the first track of each synth voice
+    if Voice in SynthVoices and CurrentPattern.Tracks.index(Voice) == Track:
+        if Voice == 'LowSynth':
+            WidgetList.append(OptionButtons(MasterWindow, Row, GridSteps + 3, 'grey', 'red', 'LowFilter',
+                                            'Attack Filter'))
+        else:
+            WidgetList.append(OptionButtons(MasterWindow, Row, GridSteps + 3, 'grey', 'red', 'HighFilter', 'Filter'))
+        WidgetList.append(WaveformMenus(MasterWindow, Row, GridSteps + 5, Voice))
+    elif Voice not in SynthVoices:
+        WidgetList.append(SampleButtons(MasterWindow, Row, GridSteps + 5, Track))
 
+WidgetList.append(BPMEntryField(MasterWindow, 1, GridSteps + 3)) # creates instance of BPMEntryField
+# Creates instance of slider with different parameters for master gain
+WidgetList.append(Sliders(MasterWindow, 1, GridSteps + 1, 100, 0, 100, 'vertical'))
+WidgetList.append(SwingSlider(MasterWindow, 1, GridSteps + 5))  # creates the swing slider below its label
 
-for i in range(6, 8):  # iterates 2 times (2 rows)
-    # Appends a list with 'X' 16 times to sequencer, 'X' is default value and corresponds to a silent/dead beat
-    Sequencer.append(['X'] * 16)
-    for j in range(1, 17):  # iterates 16 times (16 columns)
-        # Creates an instance of NoteMenus on each iteration
-        WidgetList.append(NoteMenus(MasterWindow, i, j))
+PollInterval = 20  # ms between checks for finished work from the background worker
+RenderCacheLocation = 'render-cache'  # folder rendered tracks are kept in between sessions
+EngineSampleRate = 44100  # sample rate the loops are rendered and played at, one of SampleRates in sequencer_engine
 
-WidgetList.append(BPMEntryField(MasterWindow, 1, 19)) # creates instance of BPMEntryField
+# Creates instance of PlayPause class
+PlayPauseButtons = PlayPause(MasterWindow, CurrentPattern.BPM, playcolumn=GridSteps + 3, pausecolumn=GridSteps + 4,
+                             plotcolumns=GridSteps, progressrow=GridTracks + 4)
+# Creates the profiling buttons and status readout below the grid
+ProfileLocation = 'render-profile.json'  # file the profile is written to when profiling is switched off
+ProfilingControls = ProfileControls(MasterWindow, PlayPause.Engine.Profile, PlayPause.Worker.Thread.ident,
+                                    row=GridTracks + 2,
+                                    profilecolumn=GridSteps + 3, samplercolumn=GridSteps + 4, statuscolumns=GridSteps,
+                                    memory=PlayPause.Engine.Workers == 1 or PlayPause.Engine.ExecutorType == 'process')
+# Creates the song controls below the profiling buttons
+SongArrangement = SongControls(MasterWindow, GridTracks + 3, repeatscolumn=GridSteps + 2, addcolumn=GridSteps + 3,
+                               exportcolumn=GridSteps + 4, clearcolumn=GridSteps + 5, statuscolumns=GridSteps)
+WidgetList.append(Labels(MasterWindow, GridTracks + 3, GridSteps + 1, 'Repeats'))
+ProjectControls = ProjectButtons(MasterWindow, GridTracks + 4, savecolumn=GridSteps + 3, loadcolumn=GridSteps + 4)
 
-for i in range(2, 8):  # iterates 6 times
-    # Creates an instance of MuteButtons and Sliders on each iteration
-    WidgetList.append(MuteButtons(MasterWindow, i, 20, 'grey', 'red'))
-    WidgetList.append(Sliders(MasterWindow, i, 18))
-# Creates instance of slider with different parameters for master gain
-WidgetList.append(Sliders(MasterWindow, 1, 17, 100, 0, 100, 'vertical'))
+# Below labels all had different text so had to be added with individual lines of code
+WidgetList.append(Labels(MasterWindow, 0, GridSteps + 1, 'Master'))
+WidgetList.append(Labels(MasterWindow, 1, GridSteps + 2, 'BPM'))
+WidgetList.append(Labels(MasterWindow, 0, GridSteps + 5, 'Swing %'))
 
-# Creates instances of OptionButtons class
-LowSynthButton = OptionButtons(MasterWindow, 6, 19, 'grey', 'red', 'LowFilter', 'Attack Filter')
-HighSynthButton = OptionButtons(MasterWindow, 7, 19, 'grey', 'red', 'HighFilter', 'Filter')
+RefreshWidgets()  # shows the steps and settings of a project opened from the command line
 
-# Creates instance of PlayPause class
-PlayPauseButtons = PlayPause(MasterWindow, BPM)
 
-# Used to label all channels without individual lines of code
-Counter = 2  # offsets the row by 2
-for Channel in ['Kick', 'Snare', 'Open HiHat', 'Closed HiHat', 'Low Synth', 'Top Synth']:
-    WidgetList.append(Labels(MasterWindow, Counter, 0, Channel))
-    Counter += 1
+# Function prints how long the window took to appear, it is called by the first pass of mainloop
+def ReportStartup():
+    print('Window ready {:.0f} ms after start'.format((time.perf_counter() - StartTime) * 1000))
 
-# Below labels all had different text so had to be added with individual lines of code
-WidgetList.append(Labels(MasterWindow, 2, 17, 'Deepness'))
-WidgetList.append(Labels(MasterWindow, 3, 17, 'Length'))
-WidgetList.append(Labels(MasterWindow, 4, 17, 'Decay'))
-WidgetList.append(Labels(MasterWindow, 5, 17, 'Length'))
-WidgetList.append(Labels(MasterWindow, 6, 17, 'Attack'))
-WidgetList.append(Labels(MasterWindow, 7, 17, 'Filter Cutoff'))
-WidgetList.append(Labels(MasterWindow, 0, 17, 'Master'))
-WidgetList.append(Labels(MasterWindow, 1, 18, 'BPM'))
+
+MasterWindow.after(0, ReportStartup)
 
 MasterWindow.mainloop()  # Maintains the GUI window until it is closed
@@ -0,0 +1,257 @@
+# Batch renderer for the audio sequencer
+# Renders every combination of the parameter sweeps in a manifest for each project in it and writes one wav file per
+# render, along with an index.json describing every file. The renders are run on a process pool, each worker
+# process keeps one RenderEngine so tracks that do not change between renders are not rendered again
+# The index is saved as the renders finish, so a run that is stopped can be started again with the same command and
+# only the renders that are missing (or whose project or parameters have changed) are run
+# Usage: python batch_render.py manifest.json [--output renders] [--workers 6] [--samplerate 44100]
+#                               [--dtype float32] [--seed 0] [--force]
+#
+# A manifest is a JSON file such as:
+# {"sweep": {"bpm": [100, 140, 180]},
+#  "patterns": [{"project": "groove.json", "sweep": {"Kick": [1, 3, 5], "highfilter": [false, true]}},
+#               {"project": "break.json", "name": "break-fast", "sweep": {"bpm": [170, 180], "swing": [0, 0.25]}}]}
+# The sweep at the top applies to every pattern and the sweep of a pattern adds to or replaces it. The parameters
+# that can be swept are bpm, mastergain, swing, lowfilter and highfilter (true or false) and the slider value of
+# any track by its name in TrackNames (Kick, Snare, Kick2 and so on). Project paths are relative to the manifest
+
+import argparse  # used to read the command line options
+import concurrent.futures  # used to render on a process pool
+import itertools  # used to build every combination of the sweeps
+import json  # used to read the manifest and write the index
+import os  # used to build the output paths
+import time  # used to measure the throughput
+
+import numpy  # numpy arrays are used to store and manipulate audio
+
+from project import LoadProject, IsNumber  # reads the patterns that are rendered
+from rendercache import CacheHash  # names each render after everything it depends on
+from sequencer_engine import RenderEngine, SampleRates
+
+# Changed whenever the layout of the index changes
+IndexVersion = 1
+IndexName = 'index.json'
+IndexInterval = 1.0  # seconds between saves of the index while renders are finishing
+
+# Parameters that can be swept other than the slider values, as {name:function(pattern, value)}
+PatternParameters = {'bpm': lambda Pattern, Value: setattr(Pattern, 'BPM', Value),
+                     'mastergain': lambda Pattern, Value: setattr(Pattern, 'MasterGain', Value),
+                     'swing': lambda Pattern, Value: setattr(Pattern, 'Swing', Value),
+                     'lowfilter': lambda Pattern, Value: Pattern.ButtonOptions.update(LowFilter=1 if Value else -1),
+                     'highfilter': lambda Pattern, Value: Pattern.ButtonOptions.update(HighFilter=1 if Value else -1)}
+
+
+# Function sets each parameter in parameters on pattern, raises ValueError for an unknown parameter or a bad value
+def ApplyParameters(pattern, parameters):
+    TrackNames = pattern.TrackNames()
+    for Name, Value in parameters.items():
+        if Name in PatternParameters:
+            if Name in ('lowfilter', 'highfilter') and not isinstance(Value, bool):
+                raise ValueError('{} must be true or false'.format(Name))
+            if Name in ('bpm', 'mastergain', 'swing') and not IsNumber(Value):
+                raise ValueError('{} must be a number'.format(Name))
+            if Name == 'bpm' and not Value > 0:
+                raise ValueError('bpm must be more than 0')
+            if Name == 'swing' and not 0 <= Value <= 0.5:
+                raise ValueError('swing must be between 0 and 0.5')
+            PatternParameters[Name](pattern, Value)
+        elif Name in TrackNames:
+            if isinstance(Value, bool) or Value not in range(1, 6):
+                raise ValueError('the slider value of {} must be 1 to 5'.format(Name))
+            pattern.SliderValues[TrackNames.index(Name)] = Value
+        else:
+            raise ValueError('unknown parameter {}, the pattern has tracks {}'.format(Name, ', '.join(TrackNames)))
+    return pattern
+
+
+# Returns the part of a file name describing one parameter, such as bpm-120, Kick2-5 or highfilter-on
+def ParameterName(name, value):
+    if isinstance(value, bool):
+        return name + ('-on' if value else '-off')
+    return name + '-' + str(value)
+
+
+# Function reads the manifest at path and returns a list of jobs, one for every render, as dictionaries with the
+# project path, the file name of the render and its parameters
+# Raises ValueError if the manifest or a sweep is not valid, before anything is rendered
+def ReadManifest(path):
+    try:
+        with open(path) as ManifestFile:
+            Manifest = json.load(ManifestFile)
+    except OSError as Error:
+        raise ValueError('unable to read the manifest: ' + str(Error))
+    except json.JSONDecodeError as Error:
+        raise ValueError('not a manifest file: ' + str(Error))
+    if not isinstance(Manifest, dict) or not isinstance(Manifest.get('patterns'), list):
+        raise ValueError('the manifest must have a list of patterns')
+
+    Directory = os.path.dirname(os.path.abspath(path))
+    Jobs = []
+    FileNames = set()
+    for Entry in Manifest['patterns']:
+        if not isinstance(Entry, dict) or 'project' not in Entry:
+            raise ValueError('every pattern in the manifest needs a project')
+        Project = os.path.normpath(os.path.join(Directory, Entry['project']))
+        Name = Entry.get('name', os.path.splitext(os.path.basename(Project))[0])
+        Sweep = dict(Manifest.get('sweep', {}))
+        Sweep.update(Entry.get('sweep', {}))
+        for Values in Sweep.values():
+            if not isinstance(Values, list) or not Values:
+                raise ValueError('each sweep of {} must be a list of at least one value'.format(Name))
+
+        # Every combination is checked on the pattern here so a bad value stops the run before it starts
+        try:
+            LoadedPattern = LoadProject(Project)
+        except OSError as Error:
+            raise ValueError('unable to read the project of {}: {}'.format(Name, Error))
+        except ValueError as Error:
+            raise ValueError('{}: {}'.format(Project, Error))
+        for Combination in itertools.product(*Sweep.values()):
+            Parameters = dict(zip(Sweep, Combination))
+            try:
+                ApplyParameters(LoadedPattern.Copy(), Parameters)
+            except TypeError as Error:  # a value of the wrong type, such as a string for the BPM
+                raise ValueError('bad value in the sweep of {}: {}'.format(Name, Error))
+            FileName = '_'.join([Name] + [ParameterName(*Parameter) for Parameter in Parameters.items()]) + '.wav'
+            if FileName in FileNames:
+                raise ValueError('more than one render is called {}, give the patterns different names'.format(
+                    FileName))
+            FileNames.add(FileName)
+            Jobs.append({'project': Project, 'file': FileName, 'parameters': Parameters})
+    return Jobs
+
+
+# Engine and projects of a worker process, set by StartWorker
+WorkerEngine = None
+WorkerProjects = {}  # Dictionary with format {project path:Pattern}, each project is only read once per process
+
+
+# Function creates the engine of a worker process, also called in this process when there is only one worker
+def StartWorker(samplerate, dtype, seed):
+    global WorkerEngine
+    WorkerEngine = RenderEngine(samplerate, dtype=dtype, seed=seed)
+    WorkerProjects.clear()
+
+
+# Function renders one job to path and returns its entry in the index
+# The file is written under a temporary name first so a file with the final name is always complete
+def RenderJob(job, path):
+    import soundfile  # used to write the wav files
+    if job['project'] not in WorkerProjects:
+        WorkerProjects[job['project']] = LoadProject(job['project'])
+    JobPattern = ApplyParameters(WorkerProjects[job['project']].Copy(), job['parameters'])
+    Start = time.perf_counter()
+    Loop = WorkerEngine.MakeMusic(JobPattern)
+    Temporary = path[:-len('.wav')] + '.part.wav'
+    soundfile.write(Temporary, Loop, WorkerEngine.SampleRate)
+    os.replace(Temporary, path)
+    return {'project': job['project'], 'parameters': job['parameters'], 'key': job['key'],
+            'samples': len(Loop), 'peak': float(numpy.abs(Loop).max()), 'rendertime': time.perf_counter() - Start}
+
+
+# Function writes index to path, through a temporary file so an index that is being saved is never left half written
+def SaveIndex(index, path):
+    with open(path + '.tmp', 'w') as IndexFile:
+        json.dump(index, IndexFile, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+# Function renders every job in the manifest at path into the output folder and returns the index
+# Jobs whose file is in the index of an earlier run with the same key are skipped unless force is True
+# progress is called with (renders finished, renders to run, renders per second) after each render
+def RunBatch(path, output, workers=None, samplerate=44100, dtype='float32', seed=0, force=False, progress=None):
+    Jobs = ReadManifest(path)
+    os.makedirs(output, exist_ok=True)
+    IndexPath = os.path.join(output, IndexName)
+    Index = {'version': IndexVersion, 'samplerate': samplerate, 'dtype': dtype, 'seed': seed, 'renders': {}}
+    PreviousRenders = {}  # Dictionary with format {file name:entry} from the index of an earlier run
+    if not force and os.path.exists(IndexPath):
+        with open(IndexPath) as IndexFile:
+            try:
+                Previous = json.load(IndexFile)
+            except json.JSONDecodeError:  # an index from a run that was killed while saving, nothing is reused
+                Previous = {}
+        if Previous.get('version') == IndexVersion:
+            PreviousRenders = Previous['renders']
+
+    # The key of each render covers the project file and everything the render is made from
+    ProjectText = {}
+    Pending = []
+    for Job in Jobs:
+        if Job['project'] not in ProjectText:
+            with open(Job['project']) as ProjectFile:
+                ProjectText[Job['project']] = ProjectFile.read()
+        Job['key'] = CacheHash((ProjectText[Job['project']], sorted(Job['parameters'].items()), samplerate, dtype,
+                                seed))
+        Previous = PreviousRenders.get(Job['file'])
+        if Previous is not None and Previous['key'] == Job['key'] and os.path.exists(os.path.join(output, Job['file'])):
+            Index['renders'][Job['file']] = Previous
+        else:
+            Pending.append(Job)
+    Index['skipped'] = len(Jobs) - len(Pending)
+    Index['rendered'] = 0
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(Pending)))
+    Start = time.perf_counter()
+    LastSave = Start
+    Executor = None
+    try:
+        if workers > 1:
+            Executor = concurrent.futures.ProcessPoolExecutor(workers, initializer=StartWorker,
+                                                              initargs=(samplerate, dtype, seed))
+            # Neighbouring jobs usually share most of their tracks, so they are given to the same worker in chunks
+            # to let its engine reuse the tracks it has already rendered
+            Chunk = max(1, min(16, len(Pending) // (workers * 4)))
+            Results = Executor.map(RenderJob, Pending, [os.path.join(output, Job['file']) for Job in Pending],
+                                   chunksize=Chunk)
+        else:
+            StartWorker(samplerate, dtype, seed)
+            Results = (RenderJob(Job, os.path.join(output, Job['file'])) for Job in Pending)
+        for Done, (Job, Entry) in enumerate(zip(Pending, Results)):
+            Index['renders'][Job['file']] = Entry
+            Index['rendered'] = Done + 1
+            if progress is not None:
+                progress(Done + 1, len(Pending), (Done + 1) / (time.perf_counter() - Start))
+            if time.perf_counter() - LastSave > IndexInterval:
+                SaveIndex(Index, IndexPath)
+                LastSave = time.perf_counter()
+    finally:
+        # The renders finished so far are saved even when the run is stopped, so the next run carries on from them
+        if Executor is not None:
+            Executor.shutdown(cancel_futures=True)
+        Index['elapsed'] = time.perf_counter() - Start
+        Index['renderspersecond'] = Index['rendered'] / Index['elapsed'] if Index['elapsed'] else 0
+        SaveIndex(Index, IndexPath)
+    return Index
+
+
+if __name__ == '__main__':
+    Parser = argparse.ArgumentParser(description='Render every pattern and parameter sweep in a manifest to wav files')
+    Parser.add_argument('manifest', help='JSON file listing the projects and the parameters to sweep')
+    Parser.add_argument('--output', default='renders', help='folder the wav files and index.json are written to')
+    Parser.add_argument('--workers', type=int, help='number of processes rendering at once (default one per core)')
+    Parser.add_argument('--samplerate', type=int, choices=SampleRates, default=44100, help='sample rate rendered at')
+    Parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32', help='type of the rendered audio')
+    Parser.add_argument('--seed', type=int, default=0, help='seed of the hi-hat noise')
+    Parser.add_argument('--force', action='store_true', help='render everything again, even if it is in the index')
+    Arguments = Parser.parse_args()
+
+    def ShowProgress(complete, total, rate):
+        print('\r{}/{} rendered, {:.1f} renders/s'.format(complete, total, rate), end='', flush=True)
+
+    try:
+        Result = RunBatch(Arguments.manifest, Arguments.output, Arguments.workers, Arguments.samplerate,
+                          Arguments.dtype, Arguments.seed, Arguments.force, ShowProgress)
+    except ValueError as Error:
+        raise SystemExit('Unable to render the manifest: ' + str(Error))
+    except KeyboardInterrupt:
+        raise SystemExit('\nStopped, run the same command again to render the rest')
+    print('\n{} rendered and {} already rendered in {:.1f} s, {:.1f} renders/s'.format(
+        Result['rendered'], Result['skipped'], Result['elapsed'], Result['renderspersecond']))
+    Clipped = [FileName for FileName, Entry in Result['renders'].items() if Entry['peak'] > 1]
+    if Clipped:
+        print('{} render(s) peak above full scale and are clipped, lower mastergain: {}'.format(
+            len(Clipped), ', '.join(sorted(Clipped)[:5]) + (' ...' if len(Clipped) > 5 else '')))
+    print('Index written to', os.path.join(Arguments.output, IndexName))
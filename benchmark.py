@@ -0,0 +1,175 @@
+# Benchmark suite for the render pipeline in sequencer_engine.py
+# Times each stage of the engine over a range of BPMs, pattern densities and mute combinations and writes the
+# results to a JSON file so runs can be compared over time
+# Usage: python benchmark.py [--output results.json] [--compare previous.json] [--repeats 5] [--full]
+#                           [--workers 6] [--executor thread|process]
+
+import argparse  # used to read the command line options
+import itertools  # used to build every mute combination
+import json  # used to save and load results
+import platform  # used to record the machine the benchmark ran on
+import statistics  # used to summarise the repeated timings
+import time  # used to time each stage
+
+import numpy  # numpy arrays are used to store and manipulate audio
+import scipy.signal  # used to create the square waves filtered by AttackFilter
+
+from sequencer_engine import Pattern, RenderEngine, NoteFrequencies, NoteNames, ChannelNames, SynthVoices, SampleRates
+
+BPMs = [100, 120, 140, 160, 180]
+Densities = [0, 0.25, 0.5, 0.75, 1]  # fraction of the 96 cells of the grid that are active
+
+
+# Function creates a repeatable pattern with round(density * 96) active cells, mutes is a list of True/False
+def MakePattern(bpm, density, mutes=None, seed=0):
+    Generator = numpy.random.default_rng(seed)
+    BenchPattern = Pattern(bpm=bpm)
+    if mutes is not None:
+        BenchPattern.Mutes[:] = mutes
+    # Chooses which of the 6 x 16 cells are active
+    Cells = Generator.permutation(len(ChannelNames) * 16)[:round(density * len(ChannelNames) * 16)]
+    for Cell in Cells:
+        Track, Step = divmod(int(Cell), 16)
+        if BenchPattern.Tracks[Track] in SynthVoices:  # synth tracks get a note
+            BenchPattern.SetNote(Track, Step, NoteNames[Generator.integers(len(NoteNames))])
+        else:
+            BenchPattern.SetStep(Track, Step)
+    # Both filters are on so the slowest path is measured
+    BenchPattern.ButtonOptions = {'LowFilter': 1, 'HighFilter': 1}
+    return BenchPattern
+
+
+# Function calls function repeats times and returns a summary of the timings in seconds
+def TimeCall(function, repeats, setup=None):
+    Timings = []
+    for Repeat in range(repeats):
+        if setup is not None:
+            setup()
+        Start = time.perf_counter()
+        function()
+        Timings.append(time.perf_counter() - Start)
+    return {'min': min(Timings), 'median': statistics.median(Timings), 'mean': statistics.mean(Timings),
+            'repeats': repeats}
+
+
+# Function runs every benchmark case and returns the results as a dictionary
+def RunBenchmarks(repeats, full, workers=1, executor='thread', samplerate=44100, dtype='float32'):
+    Engine = RenderEngine(samplerate, workers=workers, executor=executor, dtype=dtype)
+    # Imports scipy.signal and designs the attack filter bank now, so the first case does not time them
+    Engine.Warmup()
+    Results = []
+
+    # Records one case, the name and parameters together identify it when runs are compared
+    def Record(name, parameters, function, setup=None):
+        Case = {'name': name, 'parameters': parameters}
+        Case.update(TimeCall(function, repeats, setup))
+        Results.append(Case)
+        print('{:<32} {:<60} {:9.3f} ms'.format(name, json.dumps(parameters), Case['median'] * 1000))
+
+    SilentSequence = numpy.full(16, -1)
+    AllNotesSequence = numpy.arange(16) % len(NoteNames)
+    for BPM in BPMs:
+        BeatLength = Engine.BeatLength(BPM)
+        Envelope = Engine.EnvelopeGenerator(300, 300, 0, BeatLength)
+        Square = numpy.stack([scipy.signal.square(2 * numpy.pi * NoteFrequencies[Note]
+                                                  * numpy.arange(BeatLength) / Engine.SampleRate)
+                              for Note in NoteNames])
+
+        # The envelope cache is cleared so the time to make the envelope is measured
+        Record('EnvelopeGenerator', {'bpm': BPM},
+               lambda: Engine.EnvelopeGenerator(BeatLength / 10, BeatLength / 10, BeatLength / 8, BeatLength),
+               Engine.EnvelopeCache.Clear)
+        Record('AttackFilter', {'bpm': BPM, 'notes': 1}, lambda: Engine.AttackFilter(Square[0]))
+        Record('AttackFilter', {'bpm': BPM, 'notes': len(NoteNames)}, lambda: Engine.AttackFilter(Square))
+        for AttackFilterOption in [-1, 1]:
+            for Sequence in [SilentSequence, AllNotesSequence]:
+                # The oscillator cache is cleared so every note is generated again
+                Record('SynthDataGenerator', {'bpm': BPM, 'attackfilter': AttackFilterOption,
+                                              'notes': len(set(Sequence.tolist()) - {-1})},
+                       lambda: Engine.SynthDataGenerator(Sequence, Envelope, NoteFrequencies, BeatLength,
+                                                         AttackFilterOption), Engine.OscillatorCache.Clear)
+
+        Kick = Engine.KickData(Pattern(bpm=BPM), 0, BeatLength).copy()  # KickData returns a reused buffer
+        for Density in Densities:
+            DensityPattern = MakePattern(BPM, Density)
+            Positions = Engine.StepPositions(DensityPattern, 0)[numpy.flatnonzero(DensityPattern.Triggers[0])]
+            Loop = numpy.zeros(Engine.LoopLength(DensityPattern), dtype=Engine.DType)
+            Record('LoopGenerator', {'bpm': BPM, 'density': Density},
+                   lambda: Engine.LoopGenerator(Positions, Kick, Loop), lambda: Loop.fill(0))
+
+    # Full renders, every render cache is cleared before every repeat so each channel is rendered from scratch
+    MuteCombinations = [list(Mutes) for Mutes in itertools.product([False, True], repeat=len(ChannelNames))]
+    for BPM in BPMs:
+        for Density in Densities:
+            if full:
+                Cases = MuteCombinations
+            elif BPM == 120 and Density == 1:  # every mute combination is measured at one BPM and density
+                Cases = MuteCombinations
+            else:
+                Cases = [[False] * len(ChannelNames)]
+            for Mutes in Cases:
+                BenchPattern = MakePattern(BPM, Density, Mutes)
+                Record('MakeMusic', {'bpm': BPM, 'density': Density, 'mutes': Mutes},
+                       lambda: Engine.MakeMusic(BenchPattern), Engine.ClearCache)
+
+        # A render where only one channel has changed since the previous render
+        BenchPattern = MakePattern(BPM, 0.5)
+        Engine.ClearCache()
+        Engine.MakeMusic(BenchPattern)
+
+        def EditOneCell():
+            BenchPattern.ToggleStep(0, 0)
+        Record('MakeMusic (one edit)', {'bpm': BPM, 'density': 0.5},
+               lambda: Engine.MakeMusic(BenchPattern), EditOneCell)
+
+    Engine.Close()
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': {'platform': platform.platform(), 'processor': platform.processor(),
+                        'python': platform.python_version(), 'numpy': numpy.__version__,
+                        'scipy': scipy.__version__, 'workers': workers, 'executor': executor,
+                        'samplerate': samplerate, 'dtype': dtype},
+            'results': Results}
+
+
+# Function prints every case whose median time grew by more than threshold compared to a previous run
+# Returns the number of regressions found
+def Compare(current, previous, threshold):
+    PreviousTimes = {(Case['name'], json.dumps(Case['parameters'], sort_keys=True)): Case['median']
+                     for Case in previous['results']}
+    Regressions = 0
+    for Case in current['results']:
+        Key = (Case['name'], json.dumps(Case['parameters'], sort_keys=True))
+        if Key in PreviousTimes and Case['median'] > PreviousTimes[Key] * (1 + threshold):
+            Regressions += 1
+            print('REGRESSION {} {}: {:.3f} ms -> {:.3f} ms'.format(Key[0], Key[1], PreviousTimes[Key] * 1000,
+                                                                   Case['median'] * 1000))
+    print(Regressions, 'regression(s) found')
+    return Regressions
+
+
+if __name__ == '__main__':
+    Parser = argparse.ArgumentParser(description='Benchmark the audio sequencer render pipeline')
+    Parser.add_argument('--output', default='benchmark-results.json', help='file the results are written to')
+    Parser.add_argument('--compare', help='previous results file to check for regressions against')
+    Parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fractional slowdown reported as a regression (default 0.2)')
+    Parser.add_argument('--repeats', type=int, default=5, help='number of times each case is timed')
+    Parser.add_argument('--full', action='store_true',
+                        help='measure every mute combination at every BPM and density')
+    Parser.add_argument('--workers', type=int, default=1, help='number of channels MakeMusic renders in parallel')
+    Parser.add_argument('--executor', choices=['thread', 'process'], default='thread',
+                        help='pool used when --workers is more than 1')
+    Parser.add_argument('--samplerate', type=int, choices=SampleRates, default=44100, help='sample rate rendered at')
+    Parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32', help='type of the rendered audio')
+    Arguments = Parser.parse_args()
+
+    Results = RunBenchmarks(Arguments.repeats, Arguments.full, Arguments.workers, Arguments.executor,
+                            Arguments.samplerate, Arguments.dtype)
+    with open(Arguments.output, 'w') as ResultsFile:
+        json.dump(Results, ResultsFile, indent=1)
+    print('Results written to', Arguments.output)
+
+    if Arguments.compare:
+        with open(Arguments.compare) as PreviousFile:
+            if Compare(Results, json.load(PreviousFile), Arguments.threshold):
+                raise SystemExit(1)
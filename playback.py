@@ -0,0 +1,90 @@
+# Streaming playback for the audio sequencer
+# Audio is pulled from the current loop one block at a time by a sounddevice callback. A newly rendered loop is
+# queued as the pending loop and swapped in exactly when the current loop reaches its end, so edits are heard on
+# the next bar without stopping the stream
+
+# Requires install of PortAudio
+# sounddevice is imported by Start (or Warmup) rather than with this file, so creating a player is instant
+
+import importlib  # used to import the audio backend early
+import threading  # used to protect the loops shared with the audio callback
+
+
+class StreamingPlayer:
+    # Function initialises instances of the class
+    def __init__(self, samplerate=44100, blocksize=512):
+        self.SampleRate = samplerate
+        self.BlockSize = blocksize  # number of samples requested by each callback, sets the latency
+
+        # Double buffer, Loop is being played and PendingLoop replaces it at the next loop boundary
+        self.Loop = None
+        self.PendingLoop = None
+        self.Position = 0  # index in Loop of the next sample to be played
+        self.Lock = threading.Lock()
+
+        self.Underruns = 0  # number of callbacks where the audio device ran out of data
+        self.Stream = None
+
+    # Function queues a newly rendered loop, it is played from the start of the next bar
+    # Only a running stream waits for the bar to end, a stopped one starts the new loop from its beginning
+    def Queue(self, loop):
+        with self.Lock:
+            if self.Loop is None or self.Stream is None:  # nothing is playing so the loop can start straight away
+                self.Loop = loop
+                self.Position = 0
+            else:
+                self.PendingLoop = loop
+
+    # Function writes the next len(outdata) samples of the loop into outdata, swapping loops at the boundary
+    def FillBlock(self, outdata):
+        Frames = len(outdata)
+        Written = 0
+        with self.Lock:
+            while Written < Frames:
+                if self.Loop is None or len(self.Loop) == 0:  # nothing queued, output silence
+                    outdata[Written:] = 0
+                    return
+                # Copies as much of the loop as fits in the block without passing the end of the loop
+                Count = min(Frames - Written, len(self.Loop) - self.Position)
+                outdata[Written:Written + Count, 0] = self.Loop[self.Position:self.Position + Count]
+                Written += Count
+                self.Position += Count
+                if self.Position == len(self.Loop):  # end of the bar, start again with the newest loop
+                    self.Position = 0
+                    if self.PendingLoop is not None:
+                        self.Loop = self.PendingLoop
+                        self.PendingLoop = None
+
+    # Function called by sounddevice whenever the output stream needs another block of audio
+    def Callback(self, outdata, frames, time, status):
+        if status.output_underflow:
+            self.Underruns += 1
+        self.FillBlock(outdata)
+
+    # Function imports the audio backend, Start does this itself but calling it early makes the first Start quicker
+    def Warmup(self):
+        importlib.import_module('sounddevice')
+
+    # Function starts the output stream, the stream keeps pulling audio until Stop is called
+    def Start(self):
+        import sounddevice  # Used to output audio
+        if self.Stream is None:
+            self.Stream = sounddevice.OutputStream(samplerate=self.SampleRate, blocksize=self.BlockSize, channels=1,
+                                                   dtype='float32', callback=self.Callback)
+            self.Stream.start()
+
+    # Function stops the output stream and forgets the loops, the next Start is silent until a loop is queued, so
+    # the render made when PLAY is pressed is heard straight away rather than after a bar of the old loop
+    def Stop(self):
+        if self.Stream is not None:
+            self.Stream.stop()
+            self.Stream.close()
+            self.Stream = None
+        with self.Lock:
+            self.Loop = None
+            self.PendingLoop = None
+            self.Position = 0
+
+    # Returns True while the output stream is running
+    def Active(self):
+        return self.Stream is not None
@@ -0,0 +1,172 @@
+# Opt-in instrumentation for the render pipeline
+# RenderProfile records the wall time and allocated bytes of each stage of a render, SamplingProfiler periodically
+# samples the call stack of a thread to show where time is spent inside the stages
+# Neither records anything until it is enabled, so leaving the hooks in the engine costs almost nothing
+
+import collections  # used to count stack samples
+import contextlib  # used to write Stage as a with block
+import json  # used to dump the records
+import os  # used to shorten file names in the samples
+import sys  # used to read the stacks of other threads
+import threading  # used for the sampling thread and per-thread stage stacks
+import time  # used to time each stage
+import tracemalloc  # used to measure allocated bytes
+
+
+class RenderProfile:
+    # Function initialises instances of the class
+    def __init__(self):
+        self.Enabled = False
+        self.Memory = False  # True when allocated bytes are being measured with tracemalloc
+        # List of dictionaries with format {'stage', 'channel', 'seconds', 'bytes'} in the order the stages finished
+        self.Records = []
+        self.Lock = threading.Lock()
+        self.Local = threading.local()  # holds the stack of open stages for each thread
+
+    # Function starts recording, memory measurement slows the render down so it can be turned off
+    # tracemalloc's peak is shared by every thread, so bytes are only right when one thread renders at a time: turn
+    # memory off for an engine that renders channels on a thread pool (workers > 1 with the thread executor)
+    def Enable(self, memory=True):
+        self.Enabled = True
+        self.Memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # Function stops recording, the records are kept until Clear is called
+    def Disable(self):
+        self.Enabled = False
+        if self.Memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.Memory = False
+
+    def Clear(self):
+        with self.Lock:
+            self.Records = []
+
+    # Used as "with Profile.Stage('name'):" around each stage of the render
+    # channel is inherited from the enclosing stage when it is not given
+    # bytes is the peak memory allocated during the stage above what was allocated when it started
+    @contextlib.contextmanager
+    def Stage(self, name, channel=None):
+        if not self.Enabled:
+            yield
+            return
+        Stack = self.Local.__dict__.setdefault('Stack', [])
+        if channel is None and Stack:
+            channel = Stack[-1]['channel']
+        Frame = {'channel': channel, 'start': 0, 'peak': 0}
+        # Read once so the stage starts and ends the same way when profiling is switched on or off during it
+        Memory = self.Memory and tracemalloc.is_tracing()
+        if Memory:
+            Current, Peak = tracemalloc.get_traced_memory()
+            if Stack:  # keeps the peak of the enclosing stage before it is reset for this stage
+                Stack[-1]['peak'] = max(Stack[-1]['peak'], Peak)
+            tracemalloc.reset_peak()
+            Frame['start'] = Frame['peak'] = Current
+        Stack.append(Frame)
+        Start = time.perf_counter()
+        try:
+            yield
+        finally:
+            Seconds = time.perf_counter() - Start
+            Stack.pop()
+            Bytes = 0
+            if Memory and tracemalloc.is_tracing():
+                Peak = max(Frame['peak'], tracemalloc.get_traced_memory()[1])
+                Bytes = Peak - Frame['start']
+                if Stack:
+                    Stack[-1]['peak'] = max(Stack[-1]['peak'], Peak)
+            with self.Lock:
+                self.Records.append({'stage': name, 'channel': channel, 'seconds': Seconds, 'bytes': Bytes})
+
+    # Returns the total seconds and peak bytes of each stage (and of each channel within it) since the last Clear
+    # start skips the first records, so the summary of a single render can be made from len(Records) before it
+    def Summary(self, start=0):
+        Totals = {}
+        with self.Lock:
+            Records = self.Records[start:]
+        for Record in Records:
+            Name = Record['stage'] if Record['channel'] is None else Record['stage'] + ':' + Record['channel']
+            Total = Totals.setdefault(Name, {'seconds': 0, 'bytes': 0, 'calls': 0})
+            Total['seconds'] += Record['seconds']
+            Total['bytes'] = max(Total['bytes'], Record['bytes'])
+            Total['calls'] += 1
+        return Totals
+
+    # Function writes the records, the summary and optionally the samples of a SamplingProfiler to a JSON file
+    def Dump(self, path, sampler=None):
+        with self.Lock:
+            Data = {'records': list(self.Records)}
+        Data['summary'] = self.Summary()
+        if sampler is not None:
+            Data['samples'] = sampler.Report()
+        with open(path, 'w') as ProfileFile:
+            json.dump(Data, ProfileFile, indent=1)
+
+
+# Statistical profiler, a background thread records the call stack of the watched thread every interval seconds
+# Functions that appear in many samples are where the time is being spent
+class SamplingProfiler:
+    # Function initialises instances of the class, by default the thread that creates it is sampled
+    # Threads whose name starts with threadprefix are sampled as well, such as the thread pool of a RenderEngine,
+    # they are looked up on every sample as a pool only starts its threads when it is first used
+    def __init__(self, interval=0.005, threadid=None, threadprefix=None):
+        self.Interval = interval
+        self.ThreadId = threadid if threadid is not None else threading.get_ident()
+        self.ThreadPrefix = threadprefix
+        self.Counts = collections.Counter()  # {'file:function': number of samples the function was on the stack}
+        self.Samples = 0
+        self.StopEvent = threading.Event()
+        self.Thread = None
+
+    def Running(self):
+        return self.Thread is not None
+
+    def Start(self):
+        if self.Thread is None:
+            self.StopEvent.clear()
+            self.Thread = threading.Thread(target=self.Sample, daemon=True)
+            self.Thread.start()
+
+    def Stop(self):
+        if self.Thread is not None:
+            self.StopEvent.set()
+            self.Thread.join()
+            self.Thread = None
+
+    # Start when stopped and stop when started, used by a single toggle button
+    def Toggle(self):
+        if self.Running():
+            self.Stop()
+        else:
+            self.Start()
+
+    # Returns the idents of the threads that are sampled
+    def ThreadIds(self):
+        Ids = {self.ThreadId}
+        if self.ThreadPrefix is not None:
+            Ids.update(Thread.ident for Thread in threading.enumerate() if Thread.name.startswith(self.ThreadPrefix))
+        return Ids
+
+    # Loop run by the sampling thread, the stack of each sampled thread counts as one sample
+    def Sample(self):
+        while not self.StopEvent.wait(self.Interval):
+            Frames = sys._current_frames()
+            for ThreadId in self.ThreadIds():
+                Frame = Frames.get(ThreadId)
+                if Frame is None:
+                    continue
+                # Each function is counted once per sample even if it appears more than once in the stack
+                Functions = set()
+                while Frame is not None:
+                    Code = Frame.f_code
+                    Functions.add('{}:{}'.format(os.path.basename(Code.co_filename), Code.co_name))
+                    Frame = Frame.f_back
+                self.Counts.update(Functions)
+                self.Samples += 1
+
+    # Returns the top functions as a list of (function, fraction of samples)
+    def Report(self, top=20):
+        if not self.Samples:
+            return []
+        return [(Function, Count / self.Samples) for Function, Count in self.Counts.most_common(top)]
@@ -0,0 +1,111 @@
+# Project files for the audio sequencer
+# A project is a JSON file holding everything in a Pattern: the tracks, the steps, notes and velocities of each
+# track, the slider values, mutes, button options, waveforms, BPM, master gain, swing, the micro-timing of each step
+# and the wav sample of each track
+# Sample paths are stored relative to the project file so a folder holding a project and its samples can be moved
+
+import json  # used to write and read the project file
+import os  # used to make sample paths relative to the project file
+
+import numpy  # numpy arrays are used to store the pattern
+
+from sequencer_engine import Pattern, NoteNames, Waveforms
+
+# Changed whenever the layout of the file changes
+ProjectVersion = 1
+
+
+# Returns True for an int or float, JSON true and false are read as bools and are not numbers here
+def IsNumber(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# Function writes pattern to a project file at path
+def SaveProject(pattern, path):
+    Directory = os.path.dirname(os.path.abspath(path))
+    Samples = []
+    for Sample in pattern.Samples:
+        if Sample is not None:
+            try:
+                Sample = os.path.relpath(os.path.abspath(Sample), Directory)
+            except ValueError:  # on a different drive to the project, kept as an absolute path
+                Sample = os.path.abspath(Sample)
+        Samples.append(Sample)
+    Project = {'version': ProjectVersion,
+               'tracks': pattern.Tracks,
+               'steps': pattern.Steps,
+               'bpm': pattern.BPM,
+               'mastergain': pattern.MasterGain,
+               'buttonoptions': pattern.ButtonOptions,
+               'waveforms': pattern.Waveforms,
+               'mutes': pattern.Mutes.tolist(),
+               'slidervalues': pattern.SliderValues.tolist(),
+               # One string per track with x for a step that is played and . for one that is not
+               'triggers': [''.join('x' if Trigger else '.' for Trigger in Row) for Row in pattern.Triggers],
+               'notes': pattern.Notes.tolist(),
+               'velocities': pattern.Velocities.tolist(),
+               'swing': pattern.Swing,
+               'timing': pattern.Timing.tolist(),
+               'samples': Samples}
+    with open(path, 'w') as ProjectFile:
+        json.dump(Project, ProjectFile)
+
+
+# Function reads a project file and returns the Pattern it holds, raises ValueError if the file is not a project
+def LoadProject(path):
+    with open(path) as ProjectFile:
+        try:
+            Project = json.load(ProjectFile)
+        except json.JSONDecodeError as Error:
+            raise ValueError('not a project file: ' + str(Error))
+    if not isinstance(Project, dict) or Project.get('version') != ProjectVersion:
+        raise ValueError('not a version {} project file'.format(ProjectVersion))
+
+    try:
+        LoadedPattern = Pattern(Project['tracks'], Project['steps'], Project['bpm'], Project['buttonoptions'],
+                                waveforms=Project['waveforms'])
+        LoadedPattern.MasterGain = Project['mastergain']
+        Shape = LoadedPattern.Triggers.shape
+        LoadedPattern.Mutes[:] = Project['mutes']
+        LoadedPattern.SliderValues[:] = Project['slidervalues']
+        LoadedPattern.Triggers[:] = numpy.array([[Step == 'x' for Step in Row] for Row in Project['triggers']],
+                                                dtype=bool).reshape(Shape)
+        # Checked before they are stored as int8 (where a large note would wrap round) rather than failing in a render
+        Notes = numpy.array(Project['notes']).reshape(Shape)
+        if numpy.any(Notes < -1) or numpy.any(Notes >= len(NoteNames)):
+            raise ValueError('project file has notes outside of -1 (silent) to {}'.format(len(NoteNames) - 1))
+        LoadedPattern.Notes[:] = Notes
+        LoadedPattern.Velocities[:] = numpy.array(Project['velocities']).reshape(Shape)
+        # Projects saved before swing and micro-timing were added play every step on the beat
+        LoadedPattern.Swing = Project.get('swing', 0.0)
+        if 'timing' in Project:
+            LoadedPattern.Timing[:] = numpy.array(Project['timing']).reshape(Shape)
+        Directory = os.path.dirname(os.path.abspath(path))
+        LoadedPattern.Samples = [os.path.normpath(os.path.join(Directory, Sample)) if Sample is not None else None
+                                 for Sample in Project['samples']]
+    except (KeyError, TypeError) as Error:
+        raise ValueError('project file is missing or has a bad ' + str(Error))
+    if len(LoadedPattern.Samples) != len(LoadedPattern.Tracks):
+        raise ValueError('project file has {} samples for {} tracks'.format(len(LoadedPattern.Samples),
+                                                                             len(LoadedPattern.Tracks)))
+    # Everything a render reads is checked here, so a bad file is refused when it is loaded rather than failing later
+    # inside a render
+    if not IsNumber(LoadedPattern.BPM) or LoadedPattern.BPM <= 0:
+        raise ValueError('project file has a BPM that is not a number above 0')
+    if not IsNumber(LoadedPattern.MasterGain):
+        raise ValueError('project file has a master gain that is not a number')
+    if not isinstance(LoadedPattern.ButtonOptions, dict) or any(
+            LoadedPattern.ButtonOptions.get(Option) not in (-1, 1) for Option in ['LowFilter', 'HighFilter']):
+        raise ValueError('project file needs LowFilter and HighFilter button options of 1 or -1')
+    if not isinstance(LoadedPattern.Waveforms, dict) or any(
+            LoadedPattern.Waveforms.get(Voice) not in Waveforms for Voice in ['LowSynth', 'TopSynth']):
+        raise ValueError('project file needs LowSynth and TopSynth waveforms from ' + ', '.join(Waveforms))
+    if any(Voice == 'Snare' and Sample is None for Voice, Sample in zip(LoadedPattern.Tracks, LoadedPattern.Samples)):
+        raise ValueError('project file has a Snare track without a sample')
+    if not IsNumber(LoadedPattern.Swing):
+        raise ValueError('project file has a swing that is not a number')
+    if not 0 <= LoadedPattern.Swing <= 0.5 or numpy.any(numpy.abs(LoadedPattern.Timing) > 0.5):
+        raise ValueError('project file has swing or timing outside of half a step')
+    if numpy.any(LoadedPattern.SliderValues < 1) or numpy.any(LoadedPattern.SliderValues > 5):
+        raise ValueError('project file has slider values outside of 1 to 5')
+    return LoadedPattern
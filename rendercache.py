@@ -0,0 +1,93 @@
+# On-disk cache of rendered track loops for the audio sequencer
+# Each loop is saved as a .npy file named after a hash of everything it was rendered from, so a loop rendered in an
+# earlier session (or for another saved pattern) is loaded instead of rendered again. The files are kept under a
+# size limit by deleting the least recently used ones, a file's modification time records when it was last used
+
+import hashlib  # used to name each loop after its inputs
+import os  # used to list, time and remove the cache files
+import threading  # used to make the cache safe to share between render threads
+
+import numpy  # numpy arrays are used to store and manipulate audio
+
+# Changed whenever the engine renders the same inputs differently, so loops from older versions are not used
+CacheVersion = 2
+
+
+# Returns the name a loop is stored under, key is any value whose repr describes everything the loop depends on
+def CacheHash(key):
+    return hashlib.sha256(repr((CacheVersion, key)).encode()).hexdigest()
+
+
+class DiskCache:
+    # Function initialises instances of the class, maxbytes is the largest total size of the files in directory
+    def __init__(self, directory, maxbytes=256 * 1024 * 1024):
+        self.Directory = directory
+        self.MaxBytes = maxbytes
+        self.Lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Dictionary with format {hash:file size in bytes} of the files already in the directory
+        self.Sizes = {}
+        for FileName in os.listdir(directory):
+            if FileName.endswith('.npy'):
+                self.Sizes[FileName[:-4]] = os.path.getsize(os.path.join(directory, FileName))
+
+    def Path(self, hash):
+        return os.path.join(self.Directory, hash + '.npy')
+
+    # Returns the loop stored under hash or None, a hit marks the file as the most recently used
+    def Get(self, hash):
+        with self.Lock:
+            if hash not in self.Sizes:
+                return None
+            try:
+                Loop = numpy.load(self.Path(hash))
+                os.utime(self.Path(hash))
+            except (OSError, ValueError):  # removed by another program or only partly written
+                self.Remove(hash)
+                return None
+            return Loop
+
+    # Function stores loop under hash, then removes the least recently used files until the cache fits in MaxBytes
+    def Put(self, hash, loop):
+        with self.Lock:
+            # Written to a temporary file first so a file with the final name is always complete
+            Temporary = self.Path(hash) + '.tmp'
+            with open(Temporary, 'wb') as LoopFile:
+                numpy.save(LoopFile, loop)
+            os.replace(Temporary, self.Path(hash))
+            self.Sizes[hash] = os.path.getsize(self.Path(hash))
+            self.Evict()
+
+    # Function removes the least recently used files while the cache is bigger than MaxBytes
+    def Evict(self):
+        Total = sum(self.Sizes.values())
+        if Total <= self.MaxBytes:
+            return
+        Oldest = sorted(self.Sizes, key=self.LastUsed)
+        for Hash in Oldest:
+            if Total <= self.MaxBytes:
+                break
+            Total -= self.Sizes[Hash]
+            self.Remove(Hash)
+
+    # Returns the time the loop stored under hash was last used, 0 if its file has gone
+    def LastUsed(self, hash):
+        try:
+            return os.path.getmtime(self.Path(hash))
+        except OSError:
+            return 0
+
+    def Remove(self, hash):
+        self.Sizes.pop(hash, None)
+        if os.path.exists(self.Path(hash)):
+            os.remove(self.Path(hash))
+
+    # Function deletes every file in the cache
+    def Clear(self):
+        with self.Lock:
+            for Hash in list(self.Sizes):
+                self.Remove(Hash)
+
+    # Returns the total size of the cache files in bytes
+    def Size(self):
+        return sum(self.Sizes.values())
@@ -0,0 +1,93 @@
+# Sample bank for the audio sequencer
+# Each wav file is read from disk once and shared by every track and every render that uses it. Samples are
+# converted to float32 between -1 and 1 using the bit depth of the file and resampled when the file was recorded at a
+# different sample rate to the engine
+# With mmap=True files at the engine sample rate are memory mapped instead of read, only the part of a sample that
+# is played is ever loaded and converted, so a large library costs very little memory
+
+import math  # used to reduce the resampling ratio
+import os  # used to check when a sample file was last changed
+import threading  # used to make the bank safe to share between render threads
+
+import numpy  # numpy arrays are used to store and manipulate audio
+
+
+# Function converts integer audio to float32 between -1 and 1, dividing by the full scale of its bit depth
+# Stereo audio is mixed down to mono
+def Normalise(audio):
+    if audio.dtype.kind == 'f':
+        Audio = audio.astype(numpy.float32)
+    elif audio.dtype.kind == 'u':  # unsigned audio (8 bit) is centred on half of full scale
+        Half = (numpy.iinfo(audio.dtype).max + 1) / 2
+        Audio = (audio.astype(numpy.float32) - Half) / Half
+    else:
+        Audio = audio.astype(numpy.float32) / -numpy.iinfo(audio.dtype).min
+    if Audio.ndim > 1:
+        Audio = Audio.mean(axis=1, dtype=numpy.float32)
+    return Audio
+
+
+# Returns (modification time, size) of the file at path, or None when there is no file
+# A sample that is edited while the program runs gets a new stamp, so it is read again rather than reused
+def FileStamp(path):
+    try:
+        Stat = os.stat(path)
+    except OSError:
+        return None
+    return (Stat.st_mtime, Stat.st_size)
+
+
+class SampleBank:
+    # Function initialises instances of the class
+    def __init__(self, samplerate=44100, mmap=False):
+        self.SampleRate = samplerate
+        self.MemoryMap = mmap
+        # Dictionary with format {path:(FileStamp of the file when it was read, numpy array)}, arrays are either
+        # float32 audio or memory mapped file data
+        self.Samples = {}
+        self.Lock = threading.Lock()
+
+    # Function reads the sample at path if it has not already been read or has changed since, returns the stored array
+    def Load(self, path):
+        Stamp = FileStamp(path)
+        with self.Lock:
+            if path in self.Samples and self.Samples[path][0] == Stamp:
+                return self.Samples[path][1]
+            SampleRate, Audio = self.Read(path)
+            if SampleRate != self.SampleRate:
+                import scipy.signal  # only imported when a sample needs resampling
+                # Resampled once here, the result is kept in memory rather than mapped
+                Divisor = math.gcd(self.SampleRate, SampleRate)
+                Audio = scipy.signal.resample_poly(Normalise(Audio), self.SampleRate // Divisor,
+                                                   SampleRate // Divisor).astype(numpy.float32)
+            elif not self.MemoryMap:
+                Audio = Normalise(Audio)
+            self.Samples[path] = (Stamp, Audio)
+            return Audio
+
+    # Function reads a wav file, memory mapping it when the bank was created with mmap=True
+    def Read(self, path):
+        from scipy.io import wavfile  # imported on first use to keep importing this file fast
+        if self.MemoryMap:
+            try:
+                return wavfile.read(path, mmap=True)
+            except ValueError:  # some formats (such as 24 bit) cannot be mapped and are read instead
+                pass
+        return wavfile.read(path)
+
+    # Function loads every sample in paths now, so the first render does not have to read them
+    def Preload(self, paths):
+        for Path in paths:
+            if Path is not None:
+                self.Load(Path)
+
+    # Returns the first length samples of the sample at path as float32, padded with silence if it is shorter
+    def Slice(self, path, length):
+        Audio = self.Load(path)[:length]
+        Slice = numpy.zeros(length, dtype=numpy.float32)
+        Slice[:len(Audio)] = Normalise(Audio) if Audio.dtype != numpy.float32 or Audio.ndim > 1 else Audio
+        return Slice
+
+    def Clear(self):
+        with self.Lock:
+            self.Samples = {}
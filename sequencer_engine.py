@@ -0,0 +1,730 @@
+# Headless render engine for the audio sequencer
+# Only numpy and scipy are needed here, there are no tkinter, matplotlib or sounddevice imports, so loops can be
+# rendered on machines without a display or audio device (batch jobs, tests, servers)
+# scipy.signal takes around a second to import, so it is imported inside the functions that use it the first time
+# one of them runs (or by Warmup) rather than when this file is imported
+
+# Package imports
+
+import numpy  # numpy arrays are used to store and manipulate audio
+import os  # used to build the default snare location
+import functools  # used to cache the attack filter bank
+import collections  # OrderedDict is used for the least recently used caches
+import threading  # used to make the caches safe to share between threads
+import concurrent.futures  # used to render channels in parallel
+from profiling import RenderProfile  # opt-in timing of each stage of the render
+from samples import SampleBank, FileStamp  # reads each wav sample once and converts it to float32
+from rendercache import CacheHash  # names the loops stored in an on-disk cache
+
+# Dictionary with format {Note:Frequency(Hz)}
+NoteFrequencies = {'A': 55, 'A#': 58.27, 'B': 61.74, 'C': 65.41, 'C#': 69.3, 'D': 73.42, 'D#': 77.78,
+                   'E': 82.41, 'F': 87.31, 'F#': 92.5, 'G': 98, 'G#': 103.83}
+
+# Note names in the order of the note index stored in Pattern.Notes
+NoteNames = ['A', 'A#', 'B', 'C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#']
+
+# Names of the sounds a track can play, the default pattern has one track of each in this order
+ChannelNames = ['Kick', 'Snare', 'OpenHat', 'ClosedHat', 'LowSynth', 'TopSynth']
+DrumVoices = ['Kick', 'Snare', 'OpenHat', 'ClosedHat']  # tracks that are switched on and off
+SynthVoices = ['LowSynth', 'TopSynth']  # tracks that play notes
+
+# Supported pattern lengths in 1/4 beats
+StepCounts = [16, 32, 64]
+
+# Name prefix of the threads of the thread pool that renders channels, used to find them when profiling
+RenderThreadPrefix = 'render'
+
+# Supported sample rates in Hz
+SampleRates = [44100, 48000, 96000]
+# Sample rate the fixed lengths of the sounds (attack and release times, attack filter steps) were chosen at, they
+# are scaled by FixedLength so the sounds last the same time at every sample rate
+ReferenceSampleRate = 44100
+
+# Snare sample shipped next to this file
+DefaultSnareLocation = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Snare.wav')
+
+# Gain applied to samples, equal to the 0.00003 the 16 bit snare was originally scaled by
+SampleGain = 0.00003 * 32768
+
+
+# Number of filters in the attack filter bank, these are evenly spaced in cutoff frequency between 200 and 2500 Hz
+AttackFilterResolution = 256
+
+
+# Designs the filters used by AttackFilter, this is done once per sample rate and the result is reused for every note
+@functools.lru_cache(maxsize=None)
+def AttackFilterBank(samplerate):
+    import scipy.signal  # used for butterworth filter design
+    PreFilter = scipy.signal.butter(10, 250, fs=samplerate, output='sos')
+    # FilterBank has shape (AttackFilterResolution, sections, 6)
+    FilterBank = numpy.stack([scipy.signal.butter(10, Cutoff, fs=samplerate, output='sos')
+                              for Cutoff in numpy.linspace(200, 2500, num=AttackFilterResolution)])
+    PostFilter = scipy.signal.butter(10, 10000, fs=samplerate, output='sos')
+    return PreFilter, FilterBank, PostFilter
+
+
+# Waveforms available to the synthesisers, 'Square' is the original scipy.signal.square wave and the others are
+# band-limited (no harmonics above half the sample rate, so no aliasing) and read from precomputed wavetables
+Waveforms = ['Square', 'BLSquare', 'BLSaw', 'BLTriangle']
+
+# Number of samples in one cycle of each wavetable
+WavetableSize = 4096
+
+
+# Builds one cycle of every band-limited waveform for every note, this is done once per sample rate
+# Returns a dictionary with format {(Waveform, Frequency):numpy array of one cycle}
+@functools.lru_cache(maxsize=None)
+def Wavetables(samplerate):
+    Tables = {}
+    for Frequency in NoteFrequencies.values():
+        # Harmonics up to half the sample rate are kept, limited by what the table size can hold
+        Harmonics = numpy.arange(1, min(int(samplerate / 2 / Frequency), WavetableSize // 2 - 1) + 1)
+        Odd = Harmonics % 2 == 1
+        Amplitudes = {'BLSquare': numpy.where(Odd, 4 / (numpy.pi * Harmonics), 0),
+                      'BLSaw': 2 / (numpy.pi * Harmonics) * (-1.0) ** (Harmonics + 1),
+                      'BLTriangle': numpy.where(Odd, 8 / (numpy.pi * Harmonics) ** 2 * (-1.0) ** ((Harmonics - 1) // 2),
+                                                0)}
+        for Waveform, Amplitude in Amplitudes.items():
+            # The table is the sum of sine waves with the above amplitudes, built with an inverse FFT
+            Spectrum = numpy.zeros(WavetableSize // 2 + 1, dtype=complex)
+            Spectrum[Harmonics] = -0.5j * Amplitude * WavetableSize
+            Table = numpy.fft.irfft(Spectrum, n=WavetableSize)
+            Tables[(Waveform, Frequency)] = Table / numpy.max(numpy.abs(Table))  # peak of 1 like the square wave
+    return Tables
+
+
+# Raised by MakeMusic and ExportSong when the cancelled function passed to them returns True
+class RenderCancelled(Exception):
+    pass
+
+
+# Dictionary-like cache holding at most maxsize entries, the least recently used entry is removed when it is full
+class LRUCache:
+    def __init__(self, maxsize=128):
+        self.MaxSize = maxsize
+        self.Entries = collections.OrderedDict()
+        self.Lock = threading.Lock()
+
+    # Returns the value stored for key or None, a hit makes the entry the most recently used
+    def Get(self, key):
+        with self.Lock:
+            if key not in self.Entries:
+                return None
+            self.Entries.move_to_end(key)
+            return self.Entries[key]
+
+    def Put(self, key, value):
+        with self.Lock:
+            self.Entries[key] = value
+            self.Entries.move_to_end(key)
+            while len(self.Entries) > self.MaxSize:
+                self.Entries.popitem(last=False)
+
+    def Clear(self):
+        with self.Lock:
+            self.Entries.clear()
+
+    def __len__(self):
+        return len(self.Entries)
+
+
+# This class holds everything the user can change that affects the rendered audio
+# Each track plays one voice from ChannelNames and has one row in each of the arrays below, so the engine can find
+# the active steps of a track with numpy instead of checking every step
+class Pattern:
+    def __init__(self, tracks=None, steps=16, bpm=120, buttonoptions=None, snarelocation=DefaultSnareLocation,
+                 waveforms=None):
+        if steps not in StepCounts:
+            raise ValueError('steps must be one of ' + ', '.join(str(Count) for Count in StepCounts))
+        for Voice in tracks or []:
+            if Voice not in ChannelNames:
+                raise ValueError('unknown voice ' + repr(Voice))
+        self.Tracks = list(tracks) if tracks is not None else list(ChannelNames)  # voice of each track
+        self.Steps = steps
+        Shape = (len(self.Tracks), steps)
+        self.Triggers = numpy.zeros(Shape, dtype=bool)  # True where a track plays on a step
+        self.Notes = numpy.full(Shape, -1, dtype=numpy.int8)  # index into NoteNames for synth tracks, -1 is silent
+        self.Velocities = numpy.ones(Shape, dtype=numpy.float32)  # gain of each hit
+        self.Mutes = numpy.zeros(len(self.Tracks), dtype=bool)
+        # Micro-timing of each step as a fraction of a step between -0.5 (early) and 0.5 (late)
+        self.Timing = numpy.zeros(Shape, dtype=numpy.float32)
+        self.Swing = 0.0  # fraction of a step every second step is played late by, 0 to 0.5
+        self.SliderValues = numpy.full(len(self.Tracks), 3, dtype=int)  # 1 to 5, meaning depends on voice
+        self.MasterGain = 100  # percent
+        self.ButtonOptions = buttonoptions if buttonoptions is not None else {'LowFilter': -1, 'HighFilter': -1}
+        self.BPM = bpm
+        # Wav file played by each track instead of its own sound, None for the voice's own sound
+        # Snare tracks have no sound of their own so they start with snarelocation
+        self.Samples = [snarelocation if Voice == 'Snare' else None for Voice in self.Tracks]
+        # Waveform of each synthesiser voice, one of Waveforms
+        self.Waveforms = waveforms if waveforms is not None else {'LowSynth': 'Square', 'TopSynth': 'Square'}
+
+    # Returns an independent copy, later changes to either pattern do not affect the other
+    def Copy(self):
+        Duplicate = Pattern(self.Tracks, self.Steps, self.BPM, dict(self.ButtonOptions), waveforms=dict(self.Waveforms))
+        for Name in ['Triggers', 'Notes', 'Velocities', 'Mutes', 'Timing', 'SliderValues']:
+            setattr(Duplicate, Name, getattr(self, Name).copy())
+        Duplicate.Samples = list(self.Samples)
+        Duplicate.Swing = self.Swing
+        Duplicate.MasterGain = self.MasterGain
+        return Duplicate
+
+    # Switches a drum step on or off, velocity is only changed when given
+    # Synth steps are switched on by giving them a note with SetNote
+    def SetStep(self, track, step, on=True, velocity=None):
+        if self.Tracks[track] not in DrumVoices:
+            raise ValueError('only drum tracks can be switched on and off, use SetNote for synth tracks')
+        self.Triggers[track, step] = on
+        if velocity is not None:
+            self.Velocities[track, step] = velocity
+
+    # Makes a drum track play the wav file at path with its envelope and slider, None goes back to its own sound
+    # Synth tracks play notes so they cannot use a sample
+    def SetSample(self, track, path):
+        if self.Tracks[track] not in DrumVoices:
+            raise ValueError('only drum tracks can play a sample')
+        if path is None and self.Tracks[track] == 'Snare':
+            path = DefaultSnareLocation
+        self.Samples[track] = path
+
+    # Moves a step early (negative) or late (positive) by offset steps
+    def SetTiming(self, track, step, offset):
+        if not -0.5 <= offset <= 0.5:
+            raise ValueError('timing offset must be between -0.5 and 0.5 steps')
+        self.Timing[track, step] = offset
+
+    def ToggleStep(self, track, step):
+        if self.Tracks[track] not in DrumVoices:
+            raise ValueError('only drum tracks can be switched on and off, use SetNote for synth tracks')
+        self.Triggers[track, step] = not self.Triggers[track, step]
+
+    # Sets the note of a synth step from its name, 'X' makes the step silent
+    def SetNote(self, track, step, note):
+        if self.Tracks[track] not in SynthVoices:
+            raise ValueError('only synth tracks play notes')
+        if note in NoteNames:
+            self.Notes[track, step] = NoteNames.index(note)
+            self.Triggers[track, step] = True
+        elif note != 'X':
+            raise ValueError('note must be one of ' + ', '.join(NoteNames) + ' or X')
+        else:
+            self.Notes[track, step] = -1
+            self.Triggers[track, step] = False
+
+    # Returns the name of the note on a synth step, 'X' when it is silent
+    def NoteName(self, track, step):
+        return NoteNames[self.Notes[track, step]] if self.Triggers[track, step] else 'X'
+
+    # Returns a name for each track, voices used by more than one track are numbered
+    def TrackNames(self):
+        Names = []
+        for Track, Voice in enumerate(self.Tracks):
+            if self.Tracks.count(Voice) > 1:
+                Voice += str(self.Tracks[:Track].count(Voice) + 1)
+            Names.append(Voice)
+        return Names
+
+
+# This class renders a Pattern to a numpy array containing the full loop of 1/4 beats
+class RenderEngine:
+    # Function initialises instances of the class
+    # workers is the number of channels rendered at the same time (None uses every core) and executor is 'thread'
+    # or 'process', processes avoid the GIL but cannot share the caches or the profile of this engine
+    # mmap=True memory maps the samples instead of reading them, for large sample libraries
+    # seed sets the noise of the hi-hats, engines with the same seed render the same pattern to the same audio
+    # diskcache is an optional rendercache.DiskCache, track loops are saved in it and loaded from it in later sessions
+    # samplerate is one of SampleRates and dtype is the numpy type of the rendered audio, float32 or float64
+    def __init__(self, samplerate=44100, workers=1, executor='thread', mmap=False, seed=0, diskcache=None,
+                 dtype=numpy.float32):
+        if samplerate not in SampleRates:
+            raise ValueError('samplerate must be one of ' + ', '.join(str(Rate) for Rate in SampleRates))
+        self.DType = numpy.dtype(dtype)
+        if self.DType not in (numpy.float32, numpy.float64):
+            raise ValueError('dtype must be float32 or float64')
+        self.SampleRate = samplerate
+        self.Seed = seed
+        self.Workers = workers if workers is not None else os.cpu_count()
+        self.ExecutorType = executor
+        self.Executor = None  # pool created on first use by Pool()
+        # Dictionary with format {Track:(key the loop was rendered with, numpy array of track loop or None)}
+        self.ChannelCache = {}
+        self.DiskCache = diskcache
+        self.MasterLoop = None  # array the channels are mixed into
+        # Records the time taken by each stage of the render once enabled with Profile.Enable()
+        self.Profile = RenderProfile()
+        # Oscillator output before processing, key is (frequency, waveform, sample rate, beat length)
+        self.OscillatorCache = LRUCache(128)
+        # Notes after the attack filter and envelope, key adds the attack filter option and envelope parameters
+        self.NoteCache = LRUCache(128)
+        # Every sample is read once and shared by all tracks, call Samples.Preload to read them before rendering
+        self.Samples = SampleBank(samplerate, mmap)
+        # Envelopes, key is (attack, release, silence, beat length)
+        self.EnvelopeCache = LRUCache(128)
+        # Drum sounds before their envelope (kick chirps, hi-hat noise and samples), key starts with the voice
+        self.SourceCache = LRUCache(128)
+        self.Local = threading.local()  # holds the scratch buffer of each render thread
+
+    # Function builds the filter bank (importing scipy.signal) and wavetables now rather than in the first render
+    # that needs them, the GUI calls it on a background thread while the window is starting
+    def Warmup(self):
+        AttackFilterBank(self.SampleRate)
+        Wavetables(self.SampleRate)
+
+    # Calculates the length of a 1/4 beat in samples for the given BPM
+    # This is the whole number of samples each sound lasts, the steps themselves are placed by StepPositions
+    def BeatLength(self, bpm):
+        return int(self.StepLength(bpm))
+
+    # Returns the exact length of a 1/4 beat in samples, this is usually not a whole number
+    def StepLength(self, bpm):
+        Duration = (60 / bpm) / 4  # calculates the duration of the 1/4 beat in seconds
+        return Duration * self.SampleRate  # as above in samples
+
+    # Returns the length of the loop of pattern in samples, rounded once for the whole loop so it keeps the tempo
+    def LoopLength(self, pattern):
+        return int(round(pattern.Steps * self.StepLength(pattern.BPM)))
+
+    # Returns the sample each step of track starts on
+    # Positions are worked out from the fractional step length and only rounded at the end, so there is no drift from
+    # rounding every step, and the swing and micro-timing of the pattern move each step by a fraction of a step
+    # A step moved before the start of the loop wraps round to the end
+    def StepPositions(self, pattern, track):
+        Steps = numpy.arange(pattern.Steps)
+        Positions = (Steps + pattern.Swing * (Steps % 2) + pattern.Timing[track]) * self.StepLength(pattern.BPM)
+        return numpy.rint(Positions).astype(int) % self.LoopLength(pattern)
+
+    # Converts a length in samples at ReferenceSampleRate to the same duration at the engine's sample rate
+    def FixedLength(self, samples):
+        return int(round(samples * self.SampleRate / ReferenceSampleRate))
+
+    # Envelopes are used in this program to fade in, fade out and to shorten the length of the sounds
+    # Each envelope is made once and kept in EnvelopeCache, the returned array is shared so it must not be changed
+    def EnvelopeGenerator(self, attack, release, silence, beatlength):
+        Key = (attack, release, silence, beatlength)
+        EnvelopeArray = self.EnvelopeCache.Get(Key)
+        if EnvelopeArray is not None:
+            return EnvelopeArray
+        Attack, Release, Silence = int(attack), int(release), int(silence)
+        Sustain = int(beatlength) - Attack - Release - Silence  # length of the part at max amplitude
+        if Sustain < 0:
+            raise ValueError('attack, release and silence are longer than the beat')
+
+        # Each part is written into its slice of a single array
+        EnvelopeArray = numpy.empty(int(beatlength), dtype=self.DType)
+        EnvelopeArray[:Attack] = numpy.linspace(0, 1, num=Attack)  # values 0 to 1 (fade in)
+        EnvelopeArray[Attack:Attack + Sustain] = 1  # max amplitude for sustain
+        # values 0 to 1 flipped horizontally (fade out)
+        EnvelopeArray[Attack + Sustain:Attack + Sustain + Release] = numpy.flip(numpy.linspace(0, 1, num=Release))
+        EnvelopeArray[Attack + Sustain + Release:] = 0  # zero amplitude for silence
+        EnvelopeArray.flags.writeable = False
+        self.EnvelopeCache.Put(Key, EnvelopeArray)
+        return EnvelopeArray
+
+    # Returns an array of length samples that is reused by every call on the same thread
+    # Drum voices write their sound into it, it is overwritten when the thread renders the next drum track
+    def ScratchBuffer(self, length):
+        Buffer = getattr(self.Local, 'Scratch', None)
+        if Buffer is None or len(Buffer) != length:
+            Buffer = self.Local.Scratch = numpy.empty(length, dtype=self.DType)
+        return Buffer
+
+    # Returns the value stored in SourceCache for key, calling make to create it the first time
+    def CachedSource(self, key, make):
+        Source = self.SourceCache.Get(key)
+        if Source is None:
+            Source = make()
+            Source.flags.writeable = False  # the cached array is shared so it must not be changed
+            self.SourceCache.Put(key, Source)
+        return Source
+
+    # Returns beatlength samples of white noise for track, the noise only depends on Seed, track and beatlength so
+    # every render of a track (in any thread or process) gets the same noise
+    def Noise(self, track, beatlength):
+        return self.CachedSource(('Noise', self.Seed, track, beatlength),
+                                 lambda: numpy.random.default_rng([self.Seed, track]).normal(0.0, 1.0, beatlength)
+                                 .astype(self.DType))
+
+    # Function makes loop from the desired sequence by adding sound at every sample position in positions
+    # Positions come from StepPositions so they can be anywhere in the loop, the part of a sound that runs past the
+    # end of the loop wraps around to carry into the next bar
+    # velocities holds the gain of each hit
+    def LoopGenerator(self, positions, sound, loop, velocities=None):
+        for Hit, Position in enumerate(positions.tolist()):
+            Sound = sound if velocities is None or velocities[Hit] == 1 else velocities[Hit] * sound
+            Count = min(len(Sound), len(loop) - Position)  # samples that fit before the end of the loop
+            loop[Position:Position + Count] += Sound[:Count]
+            if Count < len(Sound):
+                loop[:len(Sound) - Count] += Sound[Count:]
+        return loop
+
+    # Function returns one beat of a note played by waveform, repeated notes reuse the array from OscillatorCache
+    def Oscillator(self, frequency, waveform, beatlength):
+        import scipy.signal  # used to create numpy arrays for different wavetypes
+        Key = (frequency, waveform, self.SampleRate, beatlength)
+        Audio = self.OscillatorCache.Get(Key)
+        if Audio is None:
+            Phase = frequency * numpy.arange(beatlength) / self.SampleRate  # position in cycles
+            if waveform == 'Square':
+                # uses scipy.signal.square to produce a squarewave with frequency of musical note
+                Audio = scipy.signal.square(2 * numpy.pi * Phase)
+            else:
+                # Reads the wavetable with linear interpolation between neighbouring samples
+                Table = Wavetables(self.SampleRate)[(waveform, frequency)]
+                Position = (Phase % 1) * WavetableSize
+                Index = Position.astype(int)
+                Fraction = Position - Index
+                Audio = Table[Index] * (1 - Fraction) + Table[(Index + 1) % WavetableSize] * Fraction
+            Audio = Audio.astype(self.DType)
+            Audio.flags.writeable = False  # the cached array is shared so it must not be changed
+            self.OscillatorCache.Put(Key, Audio)
+        return Audio
+
+    # Returns the key of a finished note in NoteCache
+    def NoteKey(self, frequency, waveform, beatlength, attackfilter, envelopekey):
+        return (frequency, waveform, self.SampleRate, beatlength, attackfilter == 1, envelopekey)
+
+    # Function to synthesise melodic elements, the code is designed to reduce the processing required
+    # because only the notes needed are generated and if notes are repeated the same numpy array is reused
+    # When envelopekey (the parameters envelope was made from) is given, finished notes are kept in NoteCache so
+    # later renders with the same settings skip the oscillator, attack filter and envelope
+    # notes is an array of the note indices that are played, each note is only generated once
+    def SynthDataGenerator(self, notes, envelope, notefrequencies, beatlength, attackfilter, waveform='Square',
+                           envelopekey=None):
+        SynthData = {}  # will be dictionary with format {Note index:numpy array of Note audio}
+        SynthNotes = numpy.unique(notes[notes >= 0]).tolist()  # removes duplicate notes and silent steps
+        NewNotes = []  # notes that are not in NoteCache
+        for Note in SynthNotes:
+            Audio = None
+            if envelopekey is not None:
+                Audio = self.NoteCache.Get(self.NoteKey(notefrequencies[NoteNames[Note]], waveform, beatlength,
+                                                        attackfilter, envelopekey))
+            if Audio is None:
+                NewNotes.append(Note)
+            else:
+                SynthData[Note] = Audio
+        if not NewNotes:
+            return SynthData
+
+        # Each row of NoteArray is the audio of one note so all notes can be processed together
+        NoteArray = numpy.stack([self.Oscillator(notefrequencies[NoteNames[Note]], waveform, beatlength)
+                                 for Note in NewNotes])
+        if attackfilter == 1:  # user has selected the attack filter option
+            with self.Profile.Stage('AttackFilter'):
+                NoteArray = self.AttackFilter(NoteArray).astype(self.DType)  # calls AttackFilter once for every note
+        NoteArray *= envelope  # calculates product of audio with envelope
+        NoteArray.flags.writeable = False  # rows may be shared through NoteCache
+        for Row, Note in enumerate(NewNotes):
+            SynthData[Note] = NoteArray[Row]
+            if envelopekey is not None:
+                self.NoteCache.Put(self.NoteKey(notefrequencies[NoteNames[Note]], waveform, beatlength, attackfilter,
+                                                envelopekey), NoteArray[Row])
+        return (SynthData)
+
+    # Function applies an enveloped filter to provided audio (the cutoff frequency increases with time)
+    # The audio is split into steps and each step is low passed with a higher cutoff than the one before, sweeping
+    # from 200 to 2500 Hz. The filter state is carried from one step to the next so there are no clicks at the step
+    # boundaries. audio can be a single note or a 2D array with one note per row, all rows are filtered together
+    def AttackFilter(self, audio):
+        import scipy.signal  # used for audio filtering
+        # The number of samples each filter (with unique cutoff freq) will be applied to
+        StepSize = self.FixedLength(91)
+        Steps = int(audio.shape[-1] / StepSize)  # the number of whole steps that fit in the length of the audio file
+        PreFilter, FilterBank, PostFilter = AttackFilterBank(self.SampleRate)
+        Audio = scipy.signal.sosfilt(PreFilter, audio)  # applies the PreFilter to audio, cutoff of 250
+
+        # Picks the filter from the bank closest to each cutoff of an equal step size sweep from 200 to 2500
+        BankIndex = numpy.rint(numpy.linspace(0, len(FilterBank) - 1, num=Steps + 1)).astype(int)
+        # Filter state with shape (sections, ..., 2), passed between the steps instead of starting from zero each time
+        State = numpy.zeros((FilterBank.shape[1],) + Audio.shape[:-1] + (2,))
+        for k in range(0, Steps + 1):  # iterates through the number of steps+1 to account for the remainder of division
+            # Applies the filter to the corresponding slice of Audio (the last slice holds the remainder of division)
+            Slice = Audio[..., StepSize * k:StepSize * (k + 1)] if k != Steps else Audio[..., StepSize * k:]
+            Slice[...], State = scipy.signal.sosfilt(FilterBank[BankIndex[k]], Slice, zi=State)
+
+        # PostFilter is a final low pass at 10000 Hz to remove any remaining high frequency content
+        Audio = scipy.signal.sosfilt(PostFilter, Audio)
+        return Audio
+
+    #  Generation or import of drum sound data, each function returns the sound of a single 1/4 beat
+
+    # Returns the first beatlength samples of the sample played by track, or None when it plays its own sound
+    def SampleSource(self, pattern, track, beatlength):
+        Path = pattern.Samples[track]
+        if Path is None:
+            return None
+        return self.CachedSource(('Sample', Path, FileStamp(Path), beatlength),
+                                 lambda: (SampleGain * self.Samples.Slice(Path, beatlength)).astype(self.DType))
+
+    # Kick drum
+    # Uses scipy.signal.chirp to create a sine wave with logarithmic decreasing frequency
+    # range determined by KickOption
+    # KickData is the product of this chirp with the KickEnvelope (Envelope used to fade in/out and reduce popping)
+    def KickData(self, pattern, track, beatlength):
+        import scipy.signal  # used to create the chirp
+        KickOption = int(pattern.SliderValues[track])  # determined by user with slider (changes deepness of kick)
+        # calls EnvelopeGenerator
+        KickEnvelope = self.EnvelopeGenerator(self.FixedLength(100), self.FixedLength(900), 0, beatlength)
+        Source = self.SampleSource(pattern, track, beatlength)
+        if Source is None:
+            KickTimeArray = numpy.linspace(0, 0.125, num=beatlength)  # Creates numpy array with linspace
+            Source = self.CachedSource(('Kick', KickOption, beatlength), lambda: scipy.signal.chirp(
+                KickTimeArray, f0=200 + KickOption * 10, f1=55, t1=(0.04 + KickOption * 0.02), method='logarithmic')
+                .astype(self.DType))
+        return numpy.multiply(KickEnvelope, Source, out=self.ScratchBuffer(beatlength))
+
+    # Snare drum, attempted generation but was unsuccessful so uses imported WAV file
+    def SnareData(self, pattern, track, beatlength):
+        # The sample is read from the sample bank, not from disk
+        SnareFile = self.SampleSource(pattern, track, beatlength)
+        SnareOption = 6 - pattern.SliderValues[track]  # determined by user with slider (changes length of snare)
+        # Calls EnvelopeGenerator with the SnareOption determining the length of silence in the envelope
+        SnareEnvelope = self.EnvelopeGenerator(0, self.FixedLength(200), SnareOption * beatlength / 8, beatlength)
+        # SnareData is product of SnareFile with length BeatLength and SnareEnvelope
+        return numpy.multiply(SnareEnvelope, SnareFile, out=self.ScratchBuffer(beatlength))
+
+    # HiHats, use white noise from Noise
+    # Open/ClosedHatData are the product of this with the gain and respective envelopes
+    def OpenHatData(self, pattern, track, beatlength):
+        OpenHatOption = pattern.SliderValues[track]  # determined by user with slider (changes release/fade out of hat)
+        # Calls EnvelopeGenerator with the OpenHatOption determining the length of release
+        OpenHatEnvelope = self.EnvelopeGenerator(self.FixedLength(30), beatlength * OpenHatOption / 6, 0, beatlength)
+        return self.HatData(pattern, track, beatlength, OpenHatEnvelope)
+
+    def ClosedHatData(self, pattern, track, beatlength):
+        ClosedHatOption = 5 - pattern.SliderValues[track]  # determined by user with slider (changes length of hat)
+        # Calls EnvelopeGenerator with the ClosedHatOption determining the length of silence in the envelope
+        ClosedHatEnvelope = self.EnvelopeGenerator(self.FixedLength(30), beatlength / 8, beatlength * ClosedHatOption / 6,
+                                                   beatlength)
+        return self.HatData(pattern, track, beatlength, ClosedHatEnvelope)
+
+    # Product of the noise (or sample) of a hi-hat track with its envelope, noise is played with a gain of 0.07
+    def HatData(self, pattern, track, beatlength, envelope):
+        Output = self.ScratchBuffer(beatlength)
+        Source = self.SampleSource(pattern, track, beatlength)
+        if Source is None:
+            numpy.multiply(envelope, self.Noise(track, beatlength), out=Output)
+            Output *= 0.07
+        else:
+            numpy.multiply(envelope, Source, out=Output)
+        return Output
+
+    # Synthesisers
+
+    def LowSynthData(self, pattern, track, beatlength):
+        LowSynthOption = pattern.SliderValues[track] - 1  # determined by user with slider (changes attack of synth)
+        # Calls EnvelopeGenerator function with attack time determined by LowSynthOption
+        EnvelopeKey = (LowSynthOption * beatlength / 6 + beatlength / 10, beatlength / 10, 0, beatlength, 0.2)
+        LowSynthEnvelope = self.EnvelopeGenerator(*EnvelopeKey[:4]) * EnvelopeKey[4]
+        return self.SynthDataGenerator(pattern.Notes[track], LowSynthEnvelope, NoteFrequencies, beatlength,
+                                       pattern.ButtonOptions['LowFilter'], pattern.Waveforms['LowSynth'], EnvelopeKey)
+
+    def TopSynthData(self, pattern, track, beatlength):
+        EnvelopeKey = (self.FixedLength(300), self.FixedLength(300), 0, beatlength, 0.2)
+        TopSynthEnvelope = self.EnvelopeGenerator(*EnvelopeKey[:4]) * EnvelopeKey[4]
+        return self.SynthDataGenerator(pattern.Notes[track], TopSynthEnvelope, NoteFrequencies, beatlength, 2,
+                                       pattern.Waveforms['TopSynth'], EnvelopeKey)
+
+    # Returns a tuple of everything that affects the loop of a track, used as the key of ChannelCache
+    # The sample is included with its FileStamp, so a track is rendered again when its sample file is edited
+    def ChannelKey(self, pattern, track):
+        Voice = pattern.Tracks[track]
+        Sample = pattern.Samples[track]
+        Key = (Voice, pattern.BPM, pattern.Steps, pattern.Triggers[track].tobytes(), pattern.Notes[track].tobytes(),
+               pattern.Velocities[track].tobytes(), pattern.Timing[track].tobytes(), pattern.Swing,
+               int(pattern.SliderValues[track]), bool(pattern.Mutes[track]), Sample,
+               FileStamp(Sample) if Sample is not None else None)
+        if Voice == 'LowSynth':
+            Key += (pattern.ButtonOptions['LowFilter'], pattern.Waveforms['LowSynth'])
+        elif Voice == 'TopSynth':
+            Key += (pattern.ButtonOptions['HighFilter'], pattern.Waveforms['TopSynth'])
+        return Key
+
+    # Returns the name of the loop of a track in DiskCache, this adds everything outside the pattern that the loop
+    # depends on to its ChannelKey (which already includes when the sample file was last changed)
+    def DiskHash(self, key):
+        return CacheHash((key, self.SampleRate, self.DType.name, self.Seed))
+
+    # Function renders the full loop of a single track, muted tracks and tracks without hits return None
+    # buffer is an old loop of the track that can be overwritten instead of allocating a new array
+    def ChannelLoop(self, pattern, track, beatlength, buffer=None):
+        import scipy.signal  # used for the Top Synth filter
+        Voice = pattern.Tracks[track]
+        ActiveSteps = numpy.flatnonzero(pattern.Triggers[track])
+        if pattern.Mutes[track] or len(ActiveSteps) == 0:
+            return None
+
+        LoopLength = self.LoopLength(pattern)
+        if buffer is not None and len(buffer) == LoopLength:
+            Loop = buffer
+            Loop.fill(0)
+        else:
+            Loop = numpy.zeros(LoopLength, dtype=self.DType)  # numpy zero array with length of full loop
+        # Calls the matching sound data function, for example KickData for a Kick track
+        with self.Profile.Stage('SoundData'):
+            SoundData = getattr(self, Voice + 'Data')(pattern, track, beatlength)
+        # LoopGenerator is called to add each sound of the track into the loop
+        with self.Profile.Stage('LoopGenerator'):
+            Positions = self.StepPositions(pattern, track)[ActiveSteps]
+            Velocities = pattern.Velocities[track, ActiveSteps]
+            if Voice in SynthVoices:
+                # SoundData is a dictionary of notes, the steps of each note are added together
+                Notes = pattern.Notes[track, ActiveSteps]
+                for Note, Audio in SoundData.items():
+                    Mask = Notes == Note
+                    self.LoopGenerator(Positions[Mask], Audio, Loop, Velocities[Mask])
+            else:
+                self.LoopGenerator(Positions, SoundData, Loop, Velocities)
+
+        # Below code is used to apply the low pass filter to the top synth if necessary
+        if Voice == 'TopSynth' and pattern.ButtonOptions['HighFilter'] == 1:
+            TopSynthOption = pattern.SliderValues[track] - 1
+            FilterFreqs = [500, 2000, 6000, 10000, 16000]
+            # scipy.signal.butter used for butterworth filter
+            TopSynthFilter = scipy.signal.butter(10, FilterFreqs[TopSynthOption], fs=self.SampleRate, output='sos')
+            # Applies the filter to the TopSynth loop
+            with self.Profile.Stage('TopSynthFilter'):
+                Loop[:] = scipy.signal.sosfilt(TopSynthFilter, Loop)
+        return Loop
+
+    # Renders one track and records it in the profile, called directly or by a worker thread
+    def RenderChannel(self, pattern, track, beatlength, buffer=None):
+        with self.Profile.Stage('Channel', pattern.TrackNames()[track]):
+            return self.ChannelLoop(pattern, track, beatlength, buffer)
+
+    # Returns the pool used to render channels in parallel
+    def Pool(self):
+        if self.Executor is None:
+            if self.ExecutorType == 'process':
+                self.Executor = concurrent.futures.ProcessPoolExecutor(self.Workers)
+            else:
+                self.Executor = concurrent.futures.ThreadPoolExecutor(self.Workers, thread_name_prefix=RenderThreadPrefix)
+        return self.Executor
+
+    # Shuts down the pool, the engine can still be used and will create a new pool if it needs one
+    def Close(self):
+        if self.Executor is not None:
+            self.Executor.shutdown()
+            self.Executor = None
+
+    # Empties the render caches so the next MakeMusic renders every track from scratch, including its notes,
+    # envelopes, noise and sample slices (the samples stay loaded in the sample bank)
+    def ClearCache(self):
+        self.ChannelCache = {}
+        for Cache in [self.OscillatorCache, self.NoteCache, self.EnvelopeCache, self.SourceCache]:
+            Cache.Clear()
+
+    # Function renders the full loop for the given Pattern
+    # The loop of each track is kept in ChannelCache with the key it was rendered with, only tracks whose key
+    # has changed since the last call are rendered again
+    # The tracks are mixed into MasterLoop, which is reused and overwritten by the next call
+    # progress is called with (tracks rendered, tracks to render) after each track. cancelled is checked before each
+    # track and RenderCancelled is raised once it returns True, the tracks already rendered stay in ChannelCache
+    def MakeMusic(self, pattern, progress=None, cancelled=None):
+        with self.Profile.Stage('MakeMusic'):
+            return self.MixChannels(pattern, progress, cancelled)
+
+    # Renders the tracks that have changed and mixes all of the tracks, called by MakeMusic
+    def MixChannels(self, pattern, progress=None, cancelled=None):
+        beatlength = self.BeatLength(pattern.BPM)
+        LoopLength = self.LoopLength(pattern)
+
+        # Finds the tracks whose key has changed, these are the only ones rendered
+        # Their entries are removed from ChannelCache before the old loops are reused as buffers, so a render that
+        # fails part way through cannot leave an old key pointing at a loop that has been overwritten
+        Dirty = []  # list of (Track, Key, old loop)
+        for Track in range(len(pattern.Tracks)):
+            Key = self.ChannelKey(pattern, Track)
+            OldKey, OldLoop = self.ChannelCache.get(Track, (None, None))
+            if OldKey != Key:
+                self.ChannelCache.pop(Track, None)
+                Dirty.append((Track, Key, OldLoop))
+
+        # Tracks rendered before, in this session or an earlier one, are loaded from DiskCache instead
+        Hashes = {}  # Dictionary with format {Track:name of its loop in DiskCache}
+        if self.DiskCache is not None and Dirty:
+            with self.Profile.Stage('DiskCache'):
+                NotCached = []
+                for Track, Key, OldLoop in Dirty:
+                    Hashes[Track] = self.DiskHash(Key)
+                    Loop = self.DiskCache.Get(Hashes[Track])
+                    if Loop is None:
+                        NotCached.append((Track, Key, OldLoop))
+                    else:
+                        self.ChannelCache[Track] = (Key, Loop)
+                Dirty = NotCached
+
+        # Stores a newly rendered loop in ChannelCache and DiskCache, silent tracks are not worth saving
+        def Store(Track, Key, Loop):
+            self.ChannelCache[Track] = (Key, Loop)
+            if Track in Hashes and Loop is not None:
+                self.DiskCache.Put(Hashes[Track], Loop)
+
+        # Results are stored by track as they finish, so the mix below always adds the tracks in the same order
+        if self.Workers > 1 and len(Dirty) > 1:
+            # Tracks are independent until the mix so they are rendered at the same time
+            if self.ExecutorType == 'process':
+                Futures = [self.Pool().submit(RenderChannelInProcess, self.SampleRate, self.Seed, self.DType.name,
+                                              pattern, Track, beatlength)
+                           for Track, Key, OldLoop in Dirty]
+            else:
+                Futures = [self.Pool().submit(self.RenderChannel, pattern, Track, beatlength, OldLoop)
+                           for Track, Key, OldLoop in Dirty]
+            try:
+                for Done, ((Track, Key, OldLoop), Future) in enumerate(zip(Dirty, Futures)):
+                    if cancelled is not None and cancelled():
+                        for Pending in Futures:  # tracks that have not started are dropped
+                            Pending.cancel()
+                    # A track that has started writes into its old loop, so it is waited for and stored
+                    if not Future.cancelled():
+                        Store(Track, Key, Future.result())
+                        if progress is not None:
+                            progress(Done + 1, len(Dirty))
+            except BaseException:
+                # When a track fails the others may still be writing into their old loops, so they are dropped or
+                # waited for before the error is passed on. None of them are in ChannelCache until they are stored
+                for Pending in Futures:
+                    Pending.cancel()
+                concurrent.futures.wait(Futures)
+                raise
+            if any(Future.cancelled() for Future in Futures):
+                raise RenderCancelled()
+        else:
+            for Done, (Track, Key, OldLoop) in enumerate(Dirty):
+                if cancelled is not None and cancelled():
+                    raise RenderCancelled()
+                Store(Track, Key, self.RenderChannel(pattern, Track, beatlength, OldLoop))
+                if progress is not None:
+                    progress(Done + 1, len(Dirty))
+
+        with self.Profile.Stage('Mix'):
+            # Adds every track into the master loop in place, silent tracks are skipped
+            if self.MasterLoop is None or len(self.MasterLoop) != LoopLength:
+                self.MasterLoop = numpy.zeros(LoopLength, dtype=self.DType)
+            else:
+                self.MasterLoop.fill(0)
+            for Track in range(len(pattern.Tracks)):
+                Loop = self.ChannelCache[Track][1]
+                if Loop is not None:
+                    numpy.add(self.MasterLoop, Loop, out=self.MasterLoop)
+
+            # Applies master gain to full loop
+            self.MasterLoop *= pattern.MasterGain / 100
+
+        return self.MasterLoop
+
+
+# Engines used by RenderChannelInProcess, one per sample rate, seed and dtype in each worker process
+ProcessEngines = {}
+
+
+# Renders one track in a worker process of a process pool, the engine of the worker is reused between calls so
+# its filter bank, wavetables and note caches are only built once per process
+def RenderChannelInProcess(samplerate, seed, dtype, pattern, track, beatlength):
+    if (samplerate, seed, dtype) not in ProcessEngines:
+        ProcessEngines[(samplerate, seed, dtype)] = RenderEngine(samplerate, seed=seed, dtype=dtype)
+    return ProcessEngines[(samplerate, seed, dtype)].ChannelLoop(pattern, track, beatlength)
+
+
+# Convenience function for batch jobs and tests, renders a Pattern with a default engine
+def RenderLoop(pattern, samplerate=44100, dtype=numpy.float32):
+    return RenderEngine(samplerate, dtype=dtype).MakeMusic(pattern)
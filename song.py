@@ -0,0 +1,87 @@
+# Song (arrangement) mode for the audio sequencer
+# A Song chains patterns one after another, each repeated a number of times and each with its own BPM, mutes and
+# settings. It is rendered by a generator that yields fixed size blocks, so a song of any length is rendered and
+# written to disk with the memory of one loop and one block, and the first blocks are written before the rest of
+# the song has been rendered
+
+import numpy  # numpy arrays are used to store and manipulate audio
+import os  # used to remove the file of a cancelled export
+
+from sequencer_engine import RenderEngine, RenderCancelled  # renders the loop of each pattern
+
+# Number of samples in each block yielded by SongBlocks and written by ExportSong
+DefaultBlockSize = 65536
+
+
+class Song:
+    # Function initialises instances of the class
+    def __init__(self):
+        # List of [Pattern, repeats] in the order they are played
+        self.Entries = []
+
+    # Adds pattern to the end of the song, pattern is used as it is so pass pattern.Copy() to keep a snapshot
+    def Add(self, pattern, repeats=1):
+        if repeats < 1:
+            raise ValueError('repeats must be at least 1')
+        self.Entries.append([pattern, repeats])
+
+    def Clear(self):
+        self.Entries = []
+
+    # Returns a copy that can be exported while this song is still being edited, the patterns are shared
+    def Copy(self):
+        Duplicate = Song()
+        Duplicate.Entries = [list(Entry) for Entry in self.Entries]
+        return Duplicate
+
+    # Returns the length of the song in samples when rendered by engine
+    def Length(self, engine):
+        return sum(engine.LoopLength(Entry) * Repeats for Entry, Repeats in self.Entries)
+
+
+# Generator that renders song and yields it as arrays of blocksize samples in the dtype of engine, the last block may be shorter
+# Each pattern is rendered once and its loop is copied into the block for every repeat
+# The block array is reused, so each block must be used (written, played or copied) before the next is requested
+def SongBlocks(song, engine=None, blocksize=DefaultBlockSize):
+    if engine is None:
+        engine = RenderEngine()
+    Block = numpy.empty(blocksize, dtype=engine.DType)
+    Filled = 0  # number of samples of Block that hold audio
+    for Entry, Repeats in song.Entries:
+        Loop = engine.MakeMusic(Entry)  # MasterLoop of the engine, only valid until the next MakeMusic call
+        for Repeat in range(Repeats):
+            Position = 0  # index in Loop of the next sample to be copied
+            while Position < len(Loop):
+                Count = min(blocksize - Filled, len(Loop) - Position)
+                Block[Filled:Filled + Count] = Loop[Position:Position + Count]
+                Filled += Count
+                Position += Count
+                if Filled == blocksize:
+                    yield Block
+                    Filled = 0
+    if Filled:
+        yield Block[:Filled]
+
+
+# Function renders song straight into a wav file at path, one block at a time
+# progress is called with (samples written, song length) after each block. cancelled is checked before each block,
+# once it returns True the unfinished file is deleted and RenderCancelled is raised
+# Returns the number of samples written
+def ExportSong(song, path, engine=None, blocksize=DefaultBlockSize, progress=None, cancelled=None):
+    if engine is None:
+        engine = RenderEngine()
+    import soundfile  # used to write the song a block at a time, imported here as only export needs it
+    Length = song.Length(engine)
+    Written = 0
+    with soundfile.SoundFile(path, 'w', samplerate=engine.SampleRate, channels=1) as SongFile:
+        for Block in SongBlocks(song, engine, blocksize):
+            if cancelled is not None and cancelled():
+                break
+            SongFile.write(Block)
+            Written += len(Block)
+            if progress is not None:
+                progress(Written, Length)
+    if Written < Length:
+        os.remove(path)
+        raise RenderCancelled()
+    return Written
@@ -0,0 +1,88 @@
+# Background worker for the audio sequencer
+# Renders and saves are run one at a time on a worker thread so the GUI keeps responding while they run. Results
+# and progress are passed back through a queue and handed to callbacks by Poll, which the GUI calls from its own
+# thread (with tkinter's after), so the callbacks can safely change widgets
+# There is no tkinter import here, anything that calls Poll regularly can use the worker
+
+import queue  # thread-safe queues used to pass jobs to the worker and results back
+import threading  # used for the worker thread
+
+from sequencer_engine import RenderCancelled  # raised by a job that has been cancelled
+
+
+class BackgroundWorker:
+    # Function initialises instances of the class and starts the worker thread
+    def __init__(self):
+        self.Jobs = queue.Queue()  # jobs waiting to be run
+        self.Results = queue.Queue()  # (callback, arguments) waiting to be run by Poll
+        # Dictionary with format {kind:number of the newest job of that kind}, older jobs of a kind are stale
+        self.Generations = {}
+        self.Lock = threading.Lock()
+        self.Thread = threading.Thread(target=self.Run, daemon=True, name='render-worker')
+        self.Thread.start()
+
+    # Function queues function(*args, progress=..., cancelled=...) to be run on the worker thread
+    # done is called by Poll with the return value and progress with the fraction complete (0 to 1)
+    # When kind is given, submitting another job of the same kind makes this one stale: it is skipped if it has not
+    # started and told to stop through cancelled if it has. Jobs without a kind are always run to the end
+    def Submit(self, function, *args, kind=None, done=None, progress=None):
+        Generation = None
+        if kind is not None:
+            with self.Lock:
+                Generation = self.Generations.get(kind, 0) + 1
+                self.Generations[kind] = Generation
+        self.Jobs.put((function, args, kind, Generation, done, progress))
+
+    # Returns True when a newer job of the same kind has been submitted
+    def Stale(self, kind, generation):
+        if kind is None:
+            return False
+        with self.Lock:
+            return self.Generations[kind] != generation
+
+    # Loop run by the worker thread
+    def Run(self):
+        while True:
+            Job = self.Jobs.get()
+            if Job is None:  # sent by Close
+                return
+            Function, Args, Kind, Generation, Done, Progress = Job
+            if self.Stale(Kind, Generation):
+                continue
+
+            def ReportProgress(complete, total, Progress=Progress):
+                if Progress is not None and total:
+                    self.Results.put((Progress, (complete / total,)))
+
+            try:
+                Result = Function(*Args, progress=ReportProgress,
+                                  cancelled=lambda: self.Stale(Kind, Generation))
+            except RenderCancelled:
+                continue
+            except Exception as Error:  # reported on the GUI thread rather than stopping the worker
+                self.Results.put((self.Failed, (Error,)))
+                continue
+            if Done is not None:
+                self.Results.put((Done, (Result,)))
+
+    # Function runs the callbacks of every finished job and progress update, called from the GUI thread
+    # A callback that raises is reported and the rest are still run
+    def Poll(self):
+        while True:
+            try:
+                Callback, Args = self.Results.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                Callback(*Args)
+            except Exception as Error:
+                self.Failed(Error)
+
+    # Called by Poll when a job or one of its callbacks raises an exception
+    def Failed(self, error):
+        print('Background job failed:', repr(error))
+
+    # Function stops the worker thread once the jobs already submitted have run
+    def Close(self):
+        self.Jobs.put(None)
+        self.Thread.join()